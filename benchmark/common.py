@@ -0,0 +1,85 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, List, Optional
+
+root_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+
+def median_time(func: Callable[[], None], repeat: int) -> float:
+    """
+    Measures the median wall-clock time of calling the function.
+
+    Args:
+        func (Callable[[], None]): The measured function.
+        repeat (int): Number of calls.
+
+    Returns:
+        float: The median time in milliseconds.
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def run_command(code: str, cwd: str, env: dict, stdin=subprocess.DEVNULL, input_data: Optional[bytes] = None,
+                args: Optional[List[str]] = None) -> float:
+    """
+    Runs the Python code in a new interpreter, the way a console script of the package is run.
+
+    Args:
+        code (str): The Python code to run.
+        cwd (str): The working directory.
+        env (dict): The environment variables.
+        stdin (optional): The standard input of the process. Defaults to no input.
+        input_data (Optional[bytes], optional): Data written to the standard input pipe. Defaults to None.
+        args (Optional[List[str]], optional): The command line arguments. Defaults to None.
+
+    Returns:
+        float: The wall-clock run time in milliseconds.
+
+    Raises:
+        subprocess.CalledProcessError: If the process fails.
+    """
+    env = {**env, 'PYTHONPATH': os.pathsep.join(filter(None, [root_dir, env.get('PYTHONPATH')]))}
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code, *(args or [])], cwd=cwd, env=env,
+                   stdin=stdin if input_data is None else None, input=input_data,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def read_metrics(path: str) -> List[dict]:
+    """
+    Reads the request metrics written by the commands (see 'GPT_METRICS').
+
+    Args:
+        path (str): The path of the metrics file.
+
+    Returns:
+        List[dict]: The request records, or an empty list if no request was recorded.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip() != '']
+
+
+def print_results(benchmark: str, results: dict) -> None:
+    """
+    Prints the benchmark results as JSON.
+
+    Args:
+        benchmark (str): The benchmark name.
+        results (dict): The measured results.
+    """
+    print(json.dumps({'benchmark': benchmark, 'python': sys.version.split()[0], 'results': results}, indent=2))
@@ -0,0 +1,72 @@
+import base64
+import os
+import sys
+import tempfile
+
+from common import median_time, run_command, read_metrics, print_results
+from server import start_server, stub_env
+
+from cli.command.img import write_image
+
+image_code = 'from cli.command.img import run; run()'
+
+
+def write_throughput(size_mb: int, repeat: int) -> dict:
+    """
+    Measures decoding and writing a base64 encoded image to a file, the way gpt-img writes the received images.
+
+    Args:
+        size_mb (int): The decoded image size in MiB.
+        repeat (int): Number of runs.
+
+    Returns:
+        dict: The median write time and the written megabytes per second.
+    """
+    image = base64.b64encode(os.urandom(size_mb * 1024 * 1024)).decode('ascii')
+    with tempfile.TemporaryDirectory() as work_dir:
+        elapsed = median_time(lambda: write_image(image, os.path.join(work_dir, 'out.png')), repeat)
+    return {'size_mb': size_mb, 'median_ms': round(elapsed, 2), 'mb_per_second': round(size_mb / elapsed * 1000, 1)}
+
+
+def generate_run(n: int, image_bytes: int, latency: float) -> dict:
+    """
+    Measures a gpt-img run generating multiple images against the stub server.
+
+    Args:
+        n (int): Number of generated images.
+        image_bytes (int): Size of every image in bytes.
+        latency (float): Number of seconds before every response is sent.
+
+    Returns:
+        dict: The run time and the number of requests.
+    """
+    server, base_url = start_server(latency=latency, image_bytes=image_bytes)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            metrics_path = os.path.join(work_dir, 'metrics.jsonl')
+            elapsed = run_command(image_code, work_dir, stub_env(base_url, work_dir, GPT_METRICS=metrics_path),
+                                  args=['A robot walking a dog', 'out.png', f'n={n}'])
+            requests = len(read_metrics(metrics_path))
+    finally:
+        server.shutdown()
+    return {'images': n, 'image_bytes': image_bytes, 'server_latency_ms': latency * 1000,
+            'run_ms': round(elapsed, 2), 'requests': requests}
+
+
+def main():
+    """
+    Runs the image writing benchmark and prints the results as JSON.
+
+    Usage:
+        python benchmark/images.py [repeat]
+    """
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = {
+        'write': [write_throughput(size, repeat) for size in [1, 8, 32]],
+        'generate': [generate_run(1, 1024 * 1024, 0.5), generate_run(12, 1024 * 1024, 0.5)]
+    }
+    print_results('images', results)
+
+
+if __name__ == '__main__':
+    main()
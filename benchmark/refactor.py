@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+
+from common import run_command, read_metrics, print_results
+from server import start_server, stub_env
+
+refactor_code = 'from cli.command.refactor import run; run()'
+
+sample_function = '''
+
+def function_{index}(items, factor={index}):
+    """Scales the positive items."""
+    result = []
+    for item in items:
+        if item > 0:
+            result.append(item * factor)
+    return result
+'''
+
+
+def create_project(directory: str, files: int, functions: int) -> None:
+    """
+    Creates the Python source files which are refactored.
+
+    Args:
+        directory (str): The project directory.
+        files (int): Number of files.
+        functions (int): Number of functions per file.
+    """
+    source_dir = os.path.join(directory, 'src')
+    os.makedirs(source_dir, exist_ok=True)
+    for number in range(files):
+        with open(os.path.join(source_dir, f'module_{number}.py'), 'w') as f:
+            f.write('import os\n')
+            f.write(''.join(sample_function.format(index=index) for index in range(functions)))
+
+
+def refactor_run(files: int, functions: int, concurrency: int, latency: float, **env: str) -> dict:
+    """
+    Measures a gpt-refactor run over a generated project against the stub server.
+
+    Args:
+        files (int): Number of files.
+        functions (int): Number of functions per file.
+        concurrency (int): Number of files refactored at once ('GPT_REFACTOR_CONCURRENCY').
+        latency (float): Number of seconds before every response is sent.
+        **env (str): Additional environment variables.
+
+    Returns:
+        dict: The run time, the number of refactored files per second and the number of requests.
+    """
+    server, base_url = start_server(latency=latency)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            create_project(work_dir, files, functions)
+            metrics_path = os.path.join(work_dir, 'metrics.jsonl')
+            elapsed = run_command(refactor_code, work_dir,
+                                  stub_env(base_url, work_dir, GPT_METRICS=metrics_path,
+                                           GPT_REFACTOR_CONCURRENCY=str(concurrency), **env),
+                                  args=['Format this code', 'src/**/*.py', '--force'])
+            requests = len(read_metrics(metrics_path))
+    finally:
+        server.shutdown()
+    return {'files': files, 'functions': functions, 'concurrency': concurrency, 'server_latency_ms': latency * 1000,
+            **env, 'run_ms': round(elapsed, 2), 'files_per_second': round(files / elapsed * 1000, 2),
+            'requests': requests}
+
+
+def main():
+    """
+    Runs the refactoring benchmark and prints the results as JSON.
+
+    Small files are refactored sequentially and with multiple workers, and a large file is refactored in parts split
+    at syntax boundaries.
+
+    Usage:
+        python benchmark/refactor.py [files]
+    """
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    results = [
+        refactor_run(files, 10, 1, 0.1),
+        refactor_run(files, 10, 8, 0.1),
+        refactor_run(1, 500, 1, 0.1, GPT_REFACTOR_CHUNK_TOKENS='2000')
+    ]
+    print_results('refactor', results)
+
+
+if __name__ == '__main__':
+    main()
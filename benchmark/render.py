@@ -0,0 +1,85 @@
+import os
+import statistics
+import sys
+import tempfile
+
+from common import median_time, run_command, read_metrics, print_results
+from server import start_server, stub_env, filler_words
+
+from cli.render import StreamRenderer
+
+
+def render_throughput(tokens: int, width: int, repeat: int) -> dict:
+    """
+    Measures the throughput of rendering streamed text deltas, the way chatgpt-cli renders them to the terminal.
+
+    Args:
+        tokens (int): Number of rendered deltas (one word each).
+        width (int): The text width (0 - no wrapping).
+        repeat (int): Number of runs.
+
+    Returns:
+        dict: The median time and the number of rendered deltas per second.
+    """
+    deltas = [f'{filler_words[index % len(filler_words)]} ' for index in range(tokens)]
+    with open(os.devnull, 'w') as out:
+        def render():
+            renderer = StreamRenderer(out, width, '\033[37m', '\033[0m')
+            for delta in deltas:
+                renderer.write(delta)
+
+        elapsed = median_time(render, repeat)
+    return {'tokens': tokens, 'width': width, 'median_ms': round(elapsed, 2),
+            'tokens_per_second': round(tokens / elapsed * 1000)}
+
+
+def chat_session(turns: int, tokens: int, tokens_per_second: float, latency: float) -> dict:
+    """
+    Measures a complete chatgpt-cli session against the stub server, answering questions read from stdin.
+
+    Args:
+        turns (int): Number of questions.
+        tokens (int): Number of tokens of every answer.
+        tokens_per_second (float): Rate of the streamed tokens (0 - unlimited).
+        latency (float): Number of seconds before every response is sent.
+
+    Returns:
+        dict: The session run time and the median latency and time to first token of the requests.
+    """
+    server, base_url = start_server(latency=latency, tokens_per_second=tokens_per_second, output_tokens=tokens)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            metrics_path = os.path.join(work_dir, 'metrics.jsonl')
+            questions = ''.join(f'Question {turn}\n' for turn in range(turns)) + '/q\n'
+            elapsed = run_command('from cli.main import main; main()', work_dir,
+                                  stub_env(base_url, work_dir, GPT_METRICS=metrics_path),
+                                  input_data=questions.encode('utf-8'))
+            records = read_metrics(metrics_path)
+    finally:
+        server.shutdown()
+    return {'turns': turns, 'tokens': tokens, 'stream_rate': tokens_per_second, 'server_latency_ms': latency * 1000,
+            'session_ms': round(elapsed, 2),
+            'request_latency_ms': statistics.median(record['latency_ms'] for record in records) if records else None,
+            'ttft_ms': statistics.median(record['ttft_ms'] for record in records) if records else None}
+
+
+def main():
+    """
+    Runs the chat rendering benchmark and prints the results as JSON.
+
+    The renderer throughput is measured in-process with and without wrapping, and a whole chatgpt-cli session is
+    run against the local stub server with unlimited and with a realistic token rate.
+
+    Usage:
+        python benchmark/render.py [repeat]
+    """
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = {
+        'renderer': [render_throughput(10000, width, repeat) for width in [0, 80]],
+        'session': [chat_session(5, 500, 0, 0), chat_session(3, 200, 100, 0.2)]
+    }
+    print_results('render', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from common import root_dir
+
+benchmarks = ['startup', 'render', 'stdin', 'refactor', 'images']
+
+
+def git_commit() -> str:
+    """
+    Returns the commit the benchmarks were run on.
+
+    Returns:
+        str: The commit hash, with a '-dirty' suffix if there are uncommitted changes, or '' outside a git repository.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root_dir, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root_dir,
+                               capture_output=True, text=True, check=True).stdout.strip() != ''
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return f'{commit}-dirty' if dirty else commit
+
+
+def main():
+    """
+    Runs all benchmarks and prints or writes their results as a single JSON document.
+
+    Every benchmark runs in its own process. The results are labeled with the commit and the platform, so the
+    documents written for different commits can be compared.
+
+    Usage:
+        python benchmark/run.py [out_file] [benchmark ...]
+    """
+    out_file = sys.argv[1] if len(sys.argv) > 1 else None
+    selected = sys.argv[2:] or benchmarks
+
+    results = {}
+    for name in selected:
+        print(f'Running {name} benchmark...', file=sys.stderr)
+        output = subprocess.run([sys.executable, os.path.join(root_dir, 'benchmark', f'{name}.py')],
+                                capture_output=True, text=True, check=True).stdout
+        results[name] = json.loads(output)['results']
+
+    report = json.dumps({
+        'commit': git_commit(),
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results
+    }, indent=2)
+    if out_file:
+        with open(out_file, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
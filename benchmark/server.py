@@ -0,0 +1,249 @@
+import base64
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+filler_words = ['the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', 'and', '**bold**', '`code`', 'text']
+file_content_prefix = 'File content: '
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of the local stub of the OpenAI Responses, Images, Files and Batches API endpoints.
+
+    Responses are answered after the configured latency, and streamed responses are sent as server-sent events at the
+    configured token rate, with one word per text delta. Requests to refactor a file (messages starting with
+    "File content: ") are answered with the unchanged file content, so refactoring runs leave the files as they were.
+    Image requests are answered with the requested number of random images of the configured size. Batches
+    complete after they were polled the configured number of times, with the results of their requests answered the
+    same way as synchronous requests.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    tokens_per_second = 0.0
+    output_tokens = 200
+    image_bytes = 1024 * 1024
+    batch_polls = 1
+    files: Dict[str, bytes] = {}
+    batches: Dict[str, dict] = {}
+    ids = itertools.count(1)
+    lock = threading.Lock()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        time.sleep(self.latency)
+        if self.path.endswith('/responses'):
+            self.respond_text(json.loads(body))
+        elif self.path.endswith('/images/generations'):
+            self.respond_images(int(json.loads(body).get('n', 1)))
+        elif self.path.endswith('/images/edits'):
+            match = re.search(rb'name="n"\r\n\r\n(\d+)', body)
+            self.respond_images(int(match.group(1)) if match else 1)
+        elif self.path.endswith('/files'):
+            self.create_file(body)
+        elif self.path.endswith('/batches'):
+            self.create_batch(json.loads(body))
+        else:
+            self.send_not_found()
+
+    def do_GET(self) -> None:
+        batch_match = re.search(r'/batches/([^/]+)$', self.path)
+        content_match = re.search(r'/files/([^/]+)/content$', self.path)
+        if batch_match and batch_match.group(1) in self.batches:
+            self.send_json(self.poll_batch(batch_match.group(1)))
+        elif content_match and content_match.group(1) in self.files:
+            data = self.files[content_match.group(1)]
+            self.send_response(200)
+            self.send_header('content-type', 'application/octet-stream')
+            self.send_header('content-length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.send_not_found()
+
+    def response_words(self, request: dict) -> List[str]:
+        messages = request.get('input') or []
+        last = messages[-1]['content'] if len(messages) > 0 else ''
+        if last.startswith(file_content_prefix):
+            return re.findall(r'\S*\s*', last[len(file_content_prefix):])[:-1]
+        return [f'{filler_words[index % len(filler_words)]} ' for index in range(self.output_tokens)]
+
+    def respond_text(self, request: dict) -> None:
+        messages = request.get('input') or []
+        words = self.response_words(request)
+        text = ''.join(words)
+        usage = {'input_tokens': len(json.dumps(messages)) // 4, 'output_tokens': len(words), 'total_tokens': 0,
+                 'input_tokens_details': {'cached_tokens': 0}, 'output_tokens_details': {'reasoning_tokens': 0}}
+        response = {'id': f'resp_{time.time_ns()}', 'object': 'response', 'created_at': int(time.time()),
+                    'model': request.get('model'), 'output': [], 'parallel_tool_calls': False, 'tool_choice': 'auto',
+                    'tools': [], 'status': 'in_progress'}
+
+        if not request.get('stream'):
+            message = {'type': 'message', 'id': 'msg_1', 'role': 'assistant', 'status': 'completed',
+                       'content': [{'type': 'output_text', 'text': text, 'annotations': []}]}
+            time.sleep(len(words) / self.tokens_per_second if self.tokens_per_second > 0 else 0)
+            self.send_json(dict(response, status='completed', output=[message], usage=usage))
+            return
+
+        self.send_response(200)
+        self.send_header('content-type', 'text/event-stream')
+        self.send_header('transfer-encoding', 'chunked')
+        self.end_headers()
+        self.send_event({'type': 'response.created', 'sequence_number': 0, 'response': response})
+        for index, word in enumerate(words):
+            if self.tokens_per_second > 0:
+                time.sleep(1 / self.tokens_per_second)
+            self.send_event({'type': 'response.output_text.delta', 'sequence_number': index + 1, 'item_id': 'msg_1',
+                             'output_index': 0, 'content_index': 0, 'delta': word, 'logprobs': []})
+        self.send_event({'type': 'response.completed', 'sequence_number': len(words) + 1,
+                         'response': dict(response, status='completed', usage=usage)})
+        self.wfile.write(b'0\r\n\r\n')
+
+    def respond_images(self, n: int) -> None:
+        data = [{'b64_json': base64.b64encode(os.urandom(self.image_bytes)).decode('ascii')} for _ in range(n)]
+        self.send_json({'created': int(time.time()), 'data': data})
+
+    def create_file(self, body: bytes) -> None:
+        boundary = re.search(r'boundary=([^;]+)', self.headers.get('content-type', '')).group(1).strip('"')
+        data = b''
+        for part in body.split(b'--' + boundary.encode('ascii')):
+            head, _, content = part.partition(b'\r\n\r\n')
+            if b'name="file"' in head:
+                data = content[:-2] if content.endswith(b'\r\n') else content
+        self.send_json(self.store_file(data, 'batch'))
+
+    def store_file(self, data: bytes, purpose: str) -> dict:
+        with self.lock:
+            file_id = f'file-{next(self.ids)}'
+            self.files[file_id] = data
+        return {'id': file_id, 'object': 'file', 'bytes': len(data), 'created_at': int(time.time()),
+                'filename': f'{file_id}.jsonl', 'purpose': purpose, 'status': 'processed'}
+
+    def create_batch(self, request: dict) -> None:
+        with self.lock:
+            batch_id = f'batch-{next(self.ids)}'
+            self.batches[batch_id] = {'id': batch_id, 'object': 'batch', 'endpoint': request['endpoint'],
+                                      'input_file_id': request['input_file_id'],
+                                      'completion_window': request['completion_window'], 'status': 'in_progress',
+                                      'created_at': int(time.time()), 'output_file_id': None, 'error_file_id': None,
+                                      'polls': 0}
+        self.send_json(self.batch_object(batch_id))
+
+    def poll_batch(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        batch['polls'] += 1
+        if batch['status'] == 'in_progress' and batch['polls'] >= self.batch_polls:
+            lines = []
+            for line in self.files[batch['input_file_id']].decode('utf-8').splitlines():
+                request = json.loads(line)
+                text = ''.join(self.response_words(request['body']))
+                message = {'type': 'message', 'id': 'msg_1', 'role': 'assistant', 'status': 'completed',
+                           'content': [{'type': 'output_text', 'text': text, 'annotations': []}]}
+                lines.append(json.dumps({'id': f'batch_req_{len(lines)}', 'custom_id': request['custom_id'],
+                                         'response': {'status_code': 200, 'body': {'output': [message]}},
+                                         'error': None}))
+            batch['output_file_id'] = self.store_file(('\n'.join(lines) + '\n').encode('utf-8'), 'batch_output')['id']
+            batch['status'] = 'completed'
+        return self.batch_object(batch_id)
+
+    def batch_object(self, batch_id: str) -> dict:
+        return {key: value for key, value in self.batches[batch_id].items() if key != 'polls'}
+
+    def send_not_found(self) -> None:
+        self.send_json({'error': {'message': f'Unknown endpoint {self.path}', 'type': 'invalid_request_error'}}, 404)
+
+    def send_event(self, event: dict) -> None:
+        data = f'event: {event["type"]}\ndata: {json.dumps(event)}\n\n'.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def send_json(self, payload: dict, status: int = 200) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(latency: float = 0.0, tokens_per_second: float = 0.0, output_tokens: int = 200,
+                 image_bytes: int = 1024 * 1024, batch_polls: int = 1,
+                 port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Starts the stub server in a background thread.
+
+    Args:
+        latency (float, optional): Number of seconds before every response is sent. Defaults to 0.0.
+        tokens_per_second (float, optional): Rate of the streamed tokens (0 - unlimited). Defaults to 0.0.
+        output_tokens (int, optional): Number of tokens of generated responses. Defaults to 200.
+        image_bytes (int, optional): Size of every generated image in bytes. Defaults to 1 MiB.
+        batch_polls (int, optional): Number of polls after which a batch completes. Defaults to 1.
+        port (int, optional): The port to listen on (0 - any free port). Defaults to 0.
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The running server and the API base URL to set as 'OPENAI_BASE_URL'.
+    """
+    handler = type('ConfiguredStubHandler', (StubHandler,), {
+        'latency': latency, 'tokens_per_second': tokens_per_second, 'output_tokens': output_tokens,
+        'image_bytes': image_bytes, 'batch_polls': batch_polls, 'files': {}, 'batches': {},
+        'ids': itertools.count(1), 'lock': threading.Lock()
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+
+def stub_env(base_url: str, home: str, **env: str) -> dict:
+    """
+    Returns the environment for running the commands against the stub server.
+
+    The commands run with the default settings, ignoring the settings of the current environment and the user's
+    .env file, except that the response cache is disabled, so every run sends its requests.
+
+    Args:
+        base_url (str): The API base URL of the stub server.
+        home (str): The home directory of the commands, e.g. an empty temporary directory.
+        **env (str): Additional environment variables.
+
+    Returns:
+        dict: The environment variables.
+    """
+    clean = {key: value for key, value in os.environ.items()
+             if not key.startswith(('GPT_', 'CHAT_', 'HISTORY_', 'OPENAI_'))}
+    return {**clean, 'HOME': home, 'OPENAI_BASE_URL': base_url, 'OPENAI_API_KEY': 'sk-benchmark',
+            'GPT_CACHE': 'false', **env}
+
+
+def main():
+    """
+    Runs the stub server in the foreground, so the commands can be run against it manually.
+
+    Usage:
+        python benchmark/server.py [port] [latency] [tokens_per_second] [output_tokens] [image_bytes]
+    """
+    args = sys.argv[1:]
+    server, base_url = start_server(latency=float(args[1]) if len(args) > 1 else 0.0,
+                                    tokens_per_second=float(args[2]) if len(args) > 2 else 0.0,
+                                    output_tokens=int(args[3]) if len(args) > 3 else 200,
+                                    image_bytes=int(args[4]) if len(args) > 4 else 1024 * 1024,
+                                    port=int(args[0]) if len(args) > 0 else 8080)
+    print(f'Stub server listening, run the commands with OPENAI_BASE_URL={base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+entry_modules = {
+    'chatgpt-cli': 'cli.main',
+    'gpt-ai': 'cli.command.ai',
+    'gpt-img': 'cli.command.img',
+    'gpt-refactor': 'cli.command.refactor'
+}
+
+import_time_pattern = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def import_time(module: str) -> dict:
+    """
+    Measures the import time of the module using 'python -X importtime'.
+
+    Args:
+        module (str): The name of the module to import.
+
+    Returns:
+        dict: The cumulative import time of the module in microseconds and the slowest imported modules.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=root_dir,
+                            capture_output=True, text=True, check=True)
+    cumulative = 0
+    imports = []
+    for line in result.stderr.splitlines():
+        match = import_time_pattern.match(line)
+        if not match:
+            continue
+        if len(match.group(3)) <= 1:
+            # Top-level import, only the modules nested under the measured module are kept
+            if match.group(4) == module:
+                cumulative = int(match.group(2))
+                break
+            imports = []
+        else:
+            imports.append((int(match.group(2)), match.group(4)))
+    imports.sort(reverse=True)
+    return {'cumulative_us': cumulative, 'slowest': [{'module': name, 'cumulative_us': us} for us, name in imports[:5]]}
+
+
+def run_time(module: str, args: List[str], repeat: int) -> float:
+    """
+    Measures the median wall-clock time of running the command entry point with the given arguments.
+
+    Args:
+        module (str): The name of the entry point module.
+        args (List[str]): The command line arguments.
+        repeat (int): Number of runs.
+
+    Returns:
+        float: The median run time in milliseconds.
+    """
+    entry_point = 'main' if module == 'cli.main' else 'run'
+    code = f'import sys; sys.argv = ["cmd", *{args!r}]; from {module} import {entry_point}; {entry_point}()'
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=root_dir, stdin=subprocess.DEVNULL,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    """
+    Runs the startup benchmark of all console scripts and prints the results as JSON.
+
+    For every console script the cumulative import time of its entry module is measured with
+    'python -X importtime', together with the wall-clock time of the '--version' invocation.
+
+    Usage:
+        python benchmark/startup.py [repeat]
+    """
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = {}
+    for command, module in entry_modules.items():
+        results[command] = {
+            'import': import_time(module),
+            'version_ms': round(run_time(module, ['--version'], repeat), 2)
+        }
+    print(json.dumps({'benchmark': 'startup', 'python': sys.version.split()[0], 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
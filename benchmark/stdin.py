@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import root_dir, print_results
+
+# Reports the time of reading stdin and the peak memory of the process (in KiB on Linux, in bytes on macOS)
+read_code = '''
+import json, resource, time
+from cli.core import open_stdin, read_stdin
+from cli.mapped import MappedInput
+started = time.perf_counter()
+content = read_stdin()
+read_ms = (time.perf_counter() - started) * 1000
+digest_ms = None
+if {digest}:
+    started = time.perf_counter()
+    f = open_stdin()
+    if isinstance(f, MappedInput):
+        f.digest()
+        f.close()
+        digest_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{'read_ms': read_ms, 'digest_ms': digest_ms, 'chars': len(content),
+                  'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+'''
+
+sample_line = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit – čćžšđ 日本語 ✓\n'
+
+
+def read_input(path: str, pipe: bool) -> dict:
+    """
+    Measures reading the input file through stdin in a new process, either redirected from the file or piped.
+
+    Args:
+        path (str): The path of the input file.
+        pipe (bool): Whether the input is piped, otherwise stdin is redirected from the file.
+
+    Returns:
+        dict: The read time, the digest time of a redirected file and the peak memory of the process.
+    """
+    code = read_code.format(digest=not pipe)
+    env = {**os.environ, 'PYTHONPATH': root_dir}
+    with open(path, 'rb') as f:
+        if pipe:
+            process = subprocess.Popen([sys.executable, '-c', code], env=env, stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE)
+            # The file is copied into the pipe in blocks, like "cat file | gpt-ai" does
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                process.stdin.write(block)
+            process.stdin.close()
+            output = process.stdout.read()
+            process.wait()
+        else:
+            output = subprocess.run([sys.executable, '-c', code], env=env, stdin=f, stdout=subprocess.PIPE,
+                                    check=True).stdout
+    result = json.loads(output)
+    return {key: round(value, 2) if isinstance(value, float) else value for key, value in result.items()}
+
+
+def main():
+    """
+    Runs the stdin reading benchmark on large inputs and prints the results as JSON.
+
+    Usage:
+        python benchmark/stdin.py [size_mb ...]
+    """
+    sizes = [int(size) for size in sys.argv[1:]] or [1, 16, 64]
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in sizes:
+            path = os.path.join(work_dir, f'input-{size}.txt')
+            line = sample_line.encode('utf-8')
+            with open(path, 'wb') as f:
+                f.write(line * (size * 1024 * 1024 // len(line)))
+            results.append({'size_mb': size, 'file': read_input(path, False), 'pipe': read_input(path, True)})
+    print_results('stdin', results)
+
+
+if __name__ == '__main__':
+    main()
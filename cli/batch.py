@@ -0,0 +1,236 @@
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List, Callable, Optional, Tuple
+
+from cli.core import MessageType, build_response_request, get_client, get_env
+from cli.ratelimit import retry_request, default_max_retries
+
+default_batch_size = '100'
+default_batch_poll_interval = '10'
+default_batch_max_poll_interval = '300'
+default_batch_state_file = '.chatgpt-cli-{command}-batch.json'
+
+finished_statuses = ['completed', 'failed', 'expired', 'cancelled']
+
+
+def run_batch(command: str, job: str, targets: List[str], build_messages: Callable[[str], List[MessageType]],
+              apply_result: Callable[[str, Optional[str], Optional[str]], None],
+              matched_targets: Optional[List[str]] = None) -> None:
+    """
+    Processes the targets through the OpenAI Batch API.
+
+    The requests are written to JSONL files of at most 'GPT_BATCH_SIZE' requests, uploaded and submitted as
+    separate batches, which are then polled with exponential backoff. Results of every batch are applied as soon as
+    the batch finishes. The progress is saved to a local state file after every step and after every applied result,
+    so running the same command again after an interruption resumes the job instead of submitting the requests
+    again, and results which were already applied are not applied twice.
+
+    A saved job is resumed only if it was started with the same request parameters, all current targets belong to it
+    and all its targets which were not applied yet are still matched. Otherwise the command is stopped, so the results
+    of a different job are never applied.
+
+    Args:
+        command (str): The name of the command running the batch, stored in the state file.
+        job (str): The fingerprint of the request parameters shared by all targets (e.g. the prompt and the model).
+        targets (List[str]): The targets (e.g. file paths) for which requests are sent.
+        build_messages (Callable[[str], List[MessageType]]): Builds the request messages for the target.
+        apply_result (Callable[[str, Optional[str], Optional[str]], None]): Called with the target, the response
+                                                                           text and the error message of every
+                                                                           finished request.
+        matched_targets (Optional[List[str]], optional): All targets matched by the command, including the ones
+                                                         which are not sent because they are already done (e.g.
+                                                         recorded in the refactoring manifest). Defaults to the
+                                                         targets.
+
+    Raises:
+        SystemExit: If the OpenAI API returns an error, the state file can not be used or belongs to a different job.
+    """
+    state_file = get_env('GPT_BATCH_STATE_FILE', default_batch_state_file.format(command=command))
+    batch_size = int(get_env('GPT_BATCH_SIZE', default_batch_size))
+    poll_interval = float(get_env('GPT_BATCH_POLL_INTERVAL', default_batch_poll_interval))
+    max_poll_interval = float(get_env('GPT_BATCH_MAX_POLL_INTERVAL', default_batch_max_poll_interval))
+    max_retries = int(get_env('GPT_MAX_RETRIES', default_max_retries))
+
+    from openai import APIError
+
+    try:
+        state = load_state(state_file)
+        if state is None:
+            state = {'command': command, 'job': job, 'targets': targets, 'pending': targets, 'batches': []}
+            save_state(state_file, state)
+        elif resumable(state, command, job, targets, matched_targets if matched_targets is not None else targets):
+            print(f'Resuming batch job from {state_file}...', file=sys.stderr)
+        else:
+            print(f'The batch job saved in {state_file} was started with a different prompt, settings or files. '
+                  f'Run the same command as before to resume it, or delete the file to start a new batch job.',
+                  file=sys.stderr)
+            sys.exit(1)
+
+        client = get_client()
+
+        while len(state['pending']) > 0:
+            group = state['pending'][:batch_size]
+            batch_targets = {}
+            fd, batch_path = tempfile.mkstemp(suffix='.jsonl')
+            with os.fdopen(fd, 'w', encoding='utf-8') as batch_file:
+                for target in group:
+                    custom_id = f'request-{len(state["batches"])}-{len(batch_targets)}'
+                    batch_targets[custom_id] = target
+                    body = build_response_request(build_messages(target))
+                    batch_file.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': '/v1/responses',
+                                                 'body': body}) + '\n')
+            with open(batch_path, 'rb') as batch_file:
+                def upload_file():
+                    batch_file.seek(0)
+                    return client.files.create(file=batch_file, purpose='batch')
+
+                input_file = retry_request(upload_file, 'files', max_retries=max_retries)
+            os.remove(batch_path)
+
+            batch = retry_request(lambda: client.batches.create(input_file_id=input_file.id, endpoint='/v1/responses',
+                                                                completion_window='24h'),
+                                  'batches', max_retries=max_retries)
+            state['batches'].append({'id': batch.id, 'targets': batch_targets, 'applied': False, 'done': []})
+            state['pending'] = state['pending'][len(group):]
+            save_state(state_file, state)
+            print(f'Submitted batch {batch.id} with {len(group)} requests.', file=sys.stderr)
+
+        interval = poll_interval
+        while True:
+            unfinished = [batch for batch in state['batches'] if not batch['applied']]
+            if len(unfinished) == 0:
+                break
+
+            progress = False
+            for batch_state in unfinished:
+                batch = retry_request(lambda: client.batches.retrieve(batch_state['id']), 'batches',
+                                      max_retries=max_retries)
+                if batch.status not in finished_statuses:
+                    continue
+
+                results = {}
+                for file_id in [batch.output_file_id, batch.error_file_id]:
+                    if file_id:
+                        content = retry_request(lambda: client.files.content(file_id), 'files', max_retries=max_retries)
+                        for line in content.text.splitlines():
+                            if line.strip() != '':
+                                result = json.loads(line)
+                                results[result['custom_id']] = result
+
+                done = batch_state.setdefault('done', [])
+                for custom_id, target in batch_state['targets'].items():
+                    if custom_id in done:
+                        continue
+                    text, error = parse_result(results.get(custom_id), batch.status)
+                    apply_result(target, text, error)
+                    done.append(custom_id)
+                    save_state(state_file, state)
+
+                batch_state['applied'] = True
+                save_state(state_file, state)
+                progress = True
+                print(f'Batch {batch.id} {batch.status}.', file=sys.stderr)
+
+            if not progress:
+                time.sleep(interval)
+                interval = min(interval * 2, max_poll_interval)
+            else:
+                interval = poll_interval
+    except APIError as e:
+        print(f'OpenAI API returned an API Error: {e}\nRun the same command again to resume the batch job.',
+              file=sys.stderr)
+        sys.exit(2)
+    except (OSError, ValueError) as e:
+        print(f'Batch job state file {state_file} can not be used: {e}', file=sys.stderr)
+        sys.exit(2)
+
+    os.remove(state_file)
+
+
+def resumable(state: dict, command: str, job: str, targets: List[str], matched_targets: List[str]) -> bool:
+    """
+    Checks if the saved batch job can be resumed for the given job and targets.
+
+    Args:
+        state (dict): The saved batch job state.
+        command (str): The name of the command running the batch.
+        job (str): The fingerprint of the request parameters.
+        targets (List[str]): The current targets.
+        matched_targets (List[str]): All targets matched by the command, including the ones which are already done.
+
+    Returns:
+        bool: True if the job has the same parameters, all current targets belong to it and all its targets which
+              were not applied yet are among the matched targets, otherwise False.
+    """
+    if state.get('command') != command or state.get('job') != job or not isinstance(state.get('targets'), list):
+        return False
+    remaining = set(state['pending'])
+    for batch in state['batches']:
+        if not batch['applied']:
+            remaining.update(target for custom_id, target in batch['targets'].items()
+                             if custom_id not in batch.get('done', []))
+    return remaining <= set(matched_targets) and set(targets) <= set(state['targets'])
+
+
+def parse_result(result: Optional[dict], batch_status: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Extracts the response text or the error message from the batch result line.
+
+    Args:
+        result (Optional[dict]): The parsed result line or None if the request has no result.
+        batch_status (str): The final status of the batch.
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The response text and the error message.
+    """
+    if result is None:
+        return None, f'No result, batch {batch_status}'
+    if result.get('error'):
+        return None, result['error'].get('message', str(result['error']))
+
+    response = result.get('response') or {}
+    body = response.get('body') or {}
+    if response.get('status_code') != 200:
+        return None, (body.get('error') or {}).get('message', f'Request failed with status '
+                                                              f'{response.get("status_code")}')
+
+    texts = [content['text'] for item in body.get('output', []) if item.get('type') == 'message'
+             for content in item.get('content', []) if content.get('type') == 'output_text']
+    return ''.join(texts).strip('\n'), None
+
+
+def load_state(state_file: str) -> Optional[dict]:
+    """
+    Loads the batch job state.
+
+    Args:
+        state_file (str): The path of the state file.
+
+    Returns:
+        Optional[dict]: The state or None if the state file does not exist.
+
+    Raises:
+        OSError: If the state file can not be read.
+        ValueError: If the state file is not valid JSON.
+    """
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state_file: str, state: dict) -> None:
+    """
+    Atomically saves the batch job state.
+
+    Args:
+        state_file (str): The path of the state file.
+        state (dict): The state to save.
+    """
+    tmp_path = f'{state_file}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_file)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Optional, Any
+
+
+def cache_key(payload: Any) -> str:
+    """
+    Creates a content-addressed cache key for the given request payload.
+
+    The payload is serialized to canonical JSON (sorted keys, no extra whitespace), so equal requests always
+    produce the same key.
+
+    Args:
+        payload (Any): The JSON serializable request payload.
+
+    Returns:
+        str: The hex encoded SHA-256 digest of the payload.
+    """
+    serialized = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of response texts with TTL expiration and size-bounded LRU eviction.
+
+    Every entry is stored in its own JSON file named by the cache key. The file modification time is updated on
+    every hit and is used as the last access time when the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory: str, ttl: float, max_size: int):
+        """
+        Args:
+            directory (str): The directory where cache entries are stored.
+            ttl (float): Number of seconds after which an entry expires (0 - never expires).
+            max_size (int): Maximum total size of all entries in bytes (0 - unlimited).
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached text for the given key.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[str]: The cached text or None if the entry does not exist or has expired.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if 0 < self.ttl < time.time() - entry['created']:
+                os.remove(path)
+                return None
+            os.utime(path)
+            return entry['text']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key: str, text: str) -> None:
+        """
+        Stores the text for the given key and evicts the least recently used entries if the cache is too large.
+
+        Args:
+            key (str): The cache key.
+            text (str): The text to store.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'created': time.time(), 'text': text}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        """
+        Removes expired entries and then the least recently used ones until the cache fits in the maximum size.
+        """
+        now = time.time()
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            expired = 0 < self.ttl < now - mtime
+            if not expired and (self.max_size <= 0 or total_size <= self.max_size):
+                continue
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
@@ -0,0 +1,76 @@
+from typing import Iterator, TextIO
+
+from cli.core import count_tokens
+
+default_chunk_tokens = '100000'
+default_chunk_overlap_tokens = '0'
+default_chunk_concurrency = '4'
+
+chars_per_token = 4
+read_block_size = 64 * 1024
+
+
+def iter_text_chunks(stream: TextIO, max_tokens: int, overlap_tokens: int = 0) -> Iterator[str]:
+    """
+    Reads the text stream incrementally and splits it into chunks of at most the given number of tokens.
+
+    Chunks are split at the last line break (or whitespace) before the limit, and the end of every chunk can be
+    repeated at the start of the next one to keep the context between chunks. Only the current chunk is kept in
+    memory, so the memory usage is bounded by the chunk size rather than the size of the input. If the whole input
+    fits into a single chunk, it is returned unchanged.
+
+    Args:
+        stream (TextIO): The text stream to read.
+        max_tokens (int): Maximum number of tokens per chunk.
+        overlap_tokens (int, optional): Number of tokens repeated from the end of the previous chunk. Defaults to 0.
+
+    Returns:
+        Iterator[str]: Yields the chunks in the order of the input.
+    """
+    max_chars = max(1, max_tokens * chars_per_token)
+    overlap_chars = min(overlap_tokens * chars_per_token, max_chars // 2)
+    buffer = ''
+    carried = 0
+    eof = False
+    while True:
+        while not eof and len(buffer) <= max_chars:
+            block = stream.read(read_block_size)
+            if block == '':
+                eof = True
+            else:
+                buffer += block
+
+        if len(buffer) <= max_chars and count_tokens(buffer) <= max_tokens:
+            if len(buffer) > carried:
+                yield buffer
+            return
+
+        limit = min(len(buffer), max_chars)
+        end = split_position(buffer, limit)
+        tokens = count_tokens(buffer[:end])
+        while tokens > max_tokens and end > 1:
+            limit = max(1, int(end * max_tokens / tokens * 0.95))
+            end = split_position(buffer, limit)
+            tokens = count_tokens(buffer[:end])
+
+        yield buffer[:end]
+        carried = min(overlap_chars, end // 2)
+        buffer = buffer[end - carried:]
+
+
+def split_position(text: str, limit: int) -> int:
+    """
+    Finds the position where the text is split, preferring the last line break and then the last whitespace in the
+    second half of the text before the limit.
+
+    Args:
+        text (str): The text to split.
+        limit (int): Maximum length of the first part.
+
+    Returns:
+        int: The length of the first part.
+    """
+    position = text.rfind('\n', limit // 2, limit)
+    if position < 0:
+        position = max(text.rfind(' ', limit // 2, limit), text.rfind('\t', limit // 2, limit))
+    return position + 1 if position >= 0 else limit
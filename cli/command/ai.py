@@ -1,11 +1,21 @@
+import itertools
+import json
 import os
 import sys
-
-import openai
+from typing import List, Optional, Iterable, Iterator, Union
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from cli.core import ensure_api_key, read_stdin, check_args_for_key, valid_input, chatgpt_response
+from cli.batch import run_batch
+from cli.chunker import iter_text_chunks, default_chunk_tokens, default_chunk_overlap_tokens, \
+    default_chunk_concurrency
+from cli.cache import cache_key
+from cli.core import ensure_api_key, open_stdin, check_args_for_key, valid_input, chatgpt_response, extract_flag, \
+    get_env, concurrent_map, count_tokens, get_response_cache, build_response_request, shared_context, \
+    extract_context_files, MessageType
+from cli.mapped import MappedInput
+
+default_map_reduce_prompt = 'Summarize the text.'
 
 
 def run():
@@ -19,42 +29,270 @@ def run():
     Usage example:
         cat long-story.txt | gpt-ai "summarize this text in 5 bullet points"
 
+    Responses are cached on disk, so repeated identical requests are answered
+    without calling the API. Use the '--no-cache' flag to bypass the cache.
+
+    With the '--batch' flag every line of stdin is treated as a path of an
+    input file, and all files are processed with the same prompt through the
+    OpenAI Batch API. Results are printed as JSON lines as batches complete:
+        find ./docs -name "*.txt" | gpt-ai --batch "summarize this text"
+
+    With 'ctx=' reference files (comma separated paths or glob patterns) are
+    sent as a shared context at the start of every request:
+        gpt-ai "explain the retry logic" ctx=cli/ratelimit.py,cli/core.py
+
+    Stdin is read incrementally in chunks of at most 'GPT_CHUNK_TOKENS'
+    tokens. If the input does not fit into a single chunk, every chunk is
+    sent concurrently together with the prompt, and the partial answers are
+    then combined into the final answer (map-reduce).
+
     It handles the situation where neither input is provided and exits 
     the program if an API key is not valid.
 
     Exits with status code 1 if no input is provided and 2 if the response 
     from OpenAI API is None.
     """
-    content = read_stdin()
+    try:
+        stdin = open_stdin()
+    except Exception as e:
+        print(f'Error on stdin input: {e}')
+        stdin = None
+
+    no_cache = extract_flag(['--no-cache'])
+
+    batch = extract_flag(['--batch'])
+
+    extract_context_files()
 
     key_in_args, prompt = check_args_for_key()
 
+    chunk_tokens = int(get_env('GPT_CHUNK_TOKENS', default_chunk_tokens))
+    overlap_tokens = int(get_env('GPT_CHUNK_OVERLAP_TOKENS', default_chunk_overlap_tokens))
+
+    chunks = None
+    # Every token spans at least one byte, so a mapped input with fewer bytes than the chunk size is never split
+    if stdin is not None and chunk_tokens > 0 and not batch and \
+            not (isinstance(stdin, MappedInput) and len(stdin) <= chunk_tokens):
+        stdin_chunks = iter_text_chunks(stdin, chunk_tokens, overlap_tokens)
+        leading_chunks = list(itertools.islice(stdin_chunks, 2))
+        content = leading_chunks[0] if len(leading_chunks) > 0 else None
+        if len(leading_chunks) > 1:
+            chunks = itertools.chain(leading_chunks, stdin_chunks)
+    else:
+        content = stdin.read() if stdin is not None else None
+
     if not valid_input(prompt) and not valid_input(content):
         print('No input provided by either stdin nor command argument. '
               'Usage example: cat long-story.txt | gpt-ai "sumarize this text in 5 bullet points"')
         sys.exit(1)
 
-    openai.api_key = ensure_api_key(prompt=True, use_args_key=key_in_args)
+    ensure_api_key(prompt=True, use_args_key=key_in_args)
 
-    messages = []
+    if batch:
+        run_batch_job([line.strip() for line in (content or '').splitlines() if line.strip() != ''], prompt)
+        return
 
-    if valid_input(content):
-        messages.append({'role': 'user', 'content': str(content)})
+    if chunks is not None:
+        response = run_map_reduce(chunks, prompt, chunk_tokens, no_cache,
+                                  stdin.digest() if isinstance(stdin, MappedInput) else None)
+    else:
+        messages = []
+
+        if valid_input(content):
+            messages.append({'role': 'user', 'content': str(content)})
 
-    if valid_input(prompt):
-        messages.append({'role': 'user', 'content': str(prompt)})
+        if valid_input(prompt):
+            messages.append({'role': 'user', 'content': str(prompt)})
 
-    response = chatgpt_response(messages)
+        response = chatgpt_response(messages, use_cache=True, refresh_cache=no_cache)
     if response is None:
         sys.exit(2)
 
+    try:
+        if isinstance(response, str):
+            print(response)
+        else:
+            print_stream(response)
+    except BrokenPipeError:
+        # The reader closed the pipe (e.g. "gpt-ai ... | head"), redirect the remaining output to devnull so that
+        # the interpreter does not fail again when flushing stdout on exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+
+
+def run_map_reduce(chunks: Iterator[str], prompt: Optional[str], chunk_tokens: int, no_cache: bool,
+                   input_digest: Optional[str] = None) -> Union[str, Iterable[str], None]:
+    """
+    Answers the prompt for an input which does not fit into a single request.
+
+    Every chunk of the input is sent concurrently together with the prompt (map), and the partial answers are then
+    combined into the final answer (reduce). If the partial answers together exceed the chunk size, they are first
+    combined in groups until they fit into a single request. Chunks are read from the iterator only as workers become
+    available, so the memory usage stays bounded by the chunk size.
+
+    When the digest of the whole input is known, the final answer is also cached by it, so repeating the same
+    request for a large file is answered without reading the rest of the file.
+
+    Args:
+        chunks (Iterator[str]): The chunks of the input.
+        prompt (Optional[str]): The prompt answered for the whole input.
+        chunk_tokens (int): Maximum number of tokens per request.
+        no_cache (bool): Whether to bypass the response cache.
+        input_digest (Optional[str], optional): The digest of the whole input. Defaults to None.
+
+    Returns:
+        Union[str, Iterable[str], None]: The final answer, streamed the same way as a single request.
+    """
+    concurrency = int(get_env('GPT_CHUNK_CONCURRENCY', default_chunk_concurrency))
+    request = str(prompt) if valid_input(prompt) else default_map_reduce_prompt
+
+    cache = get_response_cache() if input_digest is not None else None
+    key = None
+    if cache:
+        parameters = build_response_request([])
+        key = cache_key({'model': parameters['model'], 'instructions': parameters['instructions'],
+                         'context': shared_context()[2],
+                         'temperature': parameters.get('temperature'), 'reasoning': parameters.get('reasoning'),
+                         'input_digest': input_digest, 'prompt': request, 'chunk_tokens': chunk_tokens,
+                         'overlap_tokens': get_env('GPT_CHUNK_OVERLAP_TOKENS', default_chunk_overlap_tokens)})
+        cached_text = cache.get(key) if not no_cache else None
+        if cached_text is not None:
+            return cached_text
+
+    def map_chunk(indexed_chunk) -> str:
+        index, chunk = indexed_chunk
+        # The request is the same for all parts, so it is sent before the part to keep the shared prefix cacheable
+        return response_text(chatgpt_response([
+            {'role': 'user', 'content': f'{request}\n\nThe text below is only one part of a larger input, answer '
+                                        f'only for this part.'},
+            {'role': 'user', 'content': f'Part {index + 1}:\n\n{chunk}'}
+        ], use_cache=True, refresh_cache=no_cache))
+
+    answers = {}
+    for index, _, future in concurrent_map(map_chunk, enumerate(chunks), concurrency):
+        answers[index] = future.result()
+        print(f'Processed part {index + 1} of the input.', file=sys.stderr)
+    partial_answers = [answers[index] for index in sorted(answers)]
+
+    while len(partial_answers) > 1 and count_tokens('\n\n'.join(partial_answers)) > chunk_tokens:
+        groups = []
+        for answer in partial_answers:
+            if len(groups) > 0 and (len(groups[-1]) < 2 or
+                                    count_tokens('\n\n'.join([*groups[-1], answer])) <= chunk_tokens):
+                groups[-1].append(answer)
+            else:
+                groups.append([answer])
+
+        def reduce_group(group: List[str]) -> str:
+            return response_text(chatgpt_response(reduce_messages(group, request), use_cache=True,
+                                                  refresh_cache=no_cache))
+
+        reduced = {}
+        for index, _, future in concurrent_map(reduce_group, groups, concurrency):
+            reduced[index] = future.result()
+        partial_answers = [reduced[index] for index in sorted(reduced)]
+
+    response = chatgpt_response(reduce_messages(partial_answers, request), use_cache=True, refresh_cache=no_cache)
+    if cache is None or response is None:
+        return response
     if isinstance(response, str):
-        print(response)
-    else:
-        stream_content = ''
-        for token in response:
-            stream_content += token
-        print(stream_content)
+        cache.set(key, response)
+        return response
+
+    def cached_stream() -> Iterator[str]:
+        deltas = []
+        for delta in response:
+            deltas.append(delta)
+            yield delta
+        cache.set(key, ''.join(deltas))
+
+    return cached_stream()
+
+
+def reduce_messages(answers: List[str], request: str) -> List[MessageType]:
+    """
+    Builds the messages for combining the partial answers into a single answer.
+
+    Args:
+        answers (List[str]): The answers for consecutive parts of the input.
+        request (str): The request which was answered for every part.
+
+    Returns:
+        List[MessageType]: The messages for the combining request.
+    """
+    parts = '\n\n'.join(f'Answer for part {index + 1}:\n{answer}' for index, answer in enumerate(answers))
+    return [
+        {'role': 'user', 'content': f'The answers below were given to the request "{request}" for consecutive parts '
+                                    f'of a larger input. Combine them into a single answer to the request for the '
+                                    f'whole input.'},
+        {'role': 'user', 'content': parts}
+    ]
+
+
+def response_text(response: Union[str, Iterable[str], None]) -> str:
+    """
+    Returns the full text of the response.
+
+    Args:
+        response (Union[str, Iterable[str], None]): The response returned by chatgpt_response.
+
+    Returns:
+        str: The response text.
+
+    Raises:
+        SystemExit: If the OpenAI API did not return a response.
+    """
+    if response is None:
+        sys.exit(2)
+    return response if isinstance(response, str) else ''.join(response)
+
+
+def print_stream(response: Iterable[str]) -> None:
+    """
+    Prints the streamed response to stdout as the deltas arrive.
+
+    The output is line buffered, and the first delta is flushed immediately, so tools reading the output through a
+    pipe can start consuming it at the time of the first token.
+
+    Args:
+        response (Iterable[str]): The streamed response deltas.
+    """
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(line_buffering=True)
+
+    first_delta = True
+    for token in response:
+        sys.stdout.write(token)
+        if first_delta:
+            sys.stdout.flush()
+            first_delta = False
+    sys.stdout.write('\n')
+    sys.stdout.flush()
+
+
+def run_batch_job(file_paths: List[str], prompt: Optional[str]) -> None:
+    """
+    Sends the content of every input file with the prompt through the OpenAI Batch API.
+
+    Args:
+        file_paths (List[str]): The paths of the input files.
+        prompt (Optional[str]): The prompt sent after the content of every file.
+    """
+
+    def build_messages(file_path: str) -> List[MessageType]:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            messages = [{'role': 'user', 'content': file.read()}]
+        if valid_input(prompt):
+            messages.append({'role': 'user', 'content': str(prompt)})
+        return messages
+
+    def apply_result(file_path: str, text: Optional[str], error: Optional[str]) -> None:
+        result = {'file': file_path, 'output': text} if error is None else {'file': file_path, 'error': error}
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    prompt_messages = [{'role': 'user', 'content': str(prompt)}] if valid_input(prompt) else []
+    run_batch('ai', cache_key(build_response_request(prompt_messages)), file_paths, build_messages, apply_result)
 
 
 if __name__ == '__main__':
@@ -1,11 +1,20 @@
+import base64
 import os
 import sys
-
-import openai
+import uuid
+from typing import List, Tuple, Optional, BinaryIO
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from cli.core import ensure_api_key, read_stdin, valid_input, image_bytes_response, extract_prompt_and_file_args
+from cli.core import ensure_api_key, read_stdin, valid_input, image_base64_response, extract_prompt_and_file_args, \
+    extract_flag, extract_option, concurrent_map, get_env, icase_contains, default_image_model, default_image_size
+from cli.images import prepare_input_images, default_image_preprocess, default_image_cache_dir
+
+default_image_concurrency = '4'
+max_images_per_request = 10
+
+# Number of base64 characters decoded at once, must be a multiple of 4
+decode_block_size = 256 * 1024
 
 
 def run():
@@ -17,7 +26,12 @@ def run():
     and writes the image to standard output or a specified file.
 
     Command-line usage:
-        gpt-img [api_key] [prompt] [img_out] in=[imgs_in]
+        gpt-img [api_key] [prompt] [img_out] in=[imgs_in] n=[count] [--prompts]
+
+    With 'n=' more images are generated for the prompt, and with the
+    '--prompts' flag every line of stdin is used as a separate prompt.
+    Multiple images are generated concurrently and written as numbered
+    files next to the output path (e.g. out-1.png, out-2.png).
 
     If no prompt is provided via the command line or standard input, the
     function will print an error message and exit with status code 1.
@@ -29,14 +43,80 @@ def run():
 
     content = read_stdin()
 
+    prompts_per_line = extract_flag(['--prompts'])
+
+    count = extract_option('n')
+
     prompt, img_out, images_in, key_in_args = extract_prompt_and_file_args(content is None)
     if not valid_input(prompt) and not valid_input(content):
         print('No input provided by either stdin nor command argument. '
               'Usage example: cat description.txt | gpt-img "with cartoon graphics" out.png in=sample.png')
         sys.exit(1)
 
-    openai.api_key = ensure_api_key(prompt=True, use_args_key=key_in_args)
+    try:
+        count = int(count) if count is not None else 1
+    except ValueError:
+        count = 0
+    if count < 1:
+        print('Number of images must be a positive integer. Usage example: gpt-img "Robot walking a dog" out.png n=4')
+        sys.exit(1)
+
+    prompts = []
+    if prompts_per_line and valid_input(content):
+        prompts = [combine_prompts(line, prompt) for line in content.splitlines() if valid_input(line)]
+    if len(prompts) == 0:
+        prompts = [combine_prompts(content, prompt)]
 
+    total = len(prompts) * count
+    if total > 1 and img_out is None:
+        print('Multiple images can not be written to stdout, provide the output image path. '
+              'Usage example: gpt-img "Robot walking a dog" out.png n=4')
+        sys.exit(1)
+
+    ensure_api_key(prompt=True, use_args_key=key_in_args)
+
+    if len(images_in) > 0 and icase_contains(get_env('GPT_IMAGE_PREPROCESS', default_image_preprocess),
+                                             ['true', 'yes', 'on']):
+        images_in = prepare_input_images(images_in, get_env('GPT_IMAGE_SIZE', default_image_size),
+                                         get_env('GPT_IMAGE_MODEL', default_image_model),
+                                         os.path.expanduser(get_env('GPT_IMAGE_CACHE_DIR', default_image_cache_dir)))
+
+    if total == 1:
+        images = image_base64_response(prompts[0], images_in)
+        if images is None or len(images) == 0:
+            sys.exit(2)
+        write_image(images[0], img_out)
+        return
+
+    concurrency = int(get_env('GPT_IMAGE_CONCURRENCY', default_image_concurrency))
+    failed = 0
+    for _, (number, _, n), future in concurrent_map(
+            lambda request: image_base64_response(request[1], images_in, request[2]),
+            image_requests(prompts, count), concurrency):
+        images = future.result() or []
+        failed += n - len(images)
+        for i in range(len(images)):
+            path = numbered_path(img_out, number + i)
+            write_image(images[i], path)
+            images[i] = None
+            print(f'Image written to {path}', file=sys.stderr)
+
+    if failed > 0:
+        print(f'Failed to generate {failed} of {total} images.', file=sys.stderr)
+        sys.exit(2)
+
+
+def combine_prompts(content: Optional[str], prompt: Optional[str]) -> str:
+    """
+    Combines the stdin content and the argument prompt into a single image prompt.
+
+    Args:
+        content (Optional[str]): The prompt read from stdin.
+        prompt (Optional[str]): The prompt given as a command argument.
+
+    Returns:
+        str: The combined prompt.
+    """
     combined_prompt = ''
     if valid_input(content):
         combined_prompt = combined_prompt + content
@@ -44,22 +124,88 @@ def run():
         if len(combined_prompt) > 0:
             combined_prompt = combined_prompt + '. '
         combined_prompt = combined_prompt + prompt
+    return combined_prompt
 
-    img = image_bytes_response(combined_prompt, images_in)
-    if img is None:
-        sys.exit(2)
 
+def image_requests(prompts: List[str], count: int) -> List[Tuple[int, str, int]]:
+    """
+    Splits the generation of the given number of images for every prompt into API requests.
+
+    Model dall-e-3 generates a single image per request, while other models generate up to 10 images per request.
+
+    Args:
+        prompts (List[str]): The image prompts.
+        count (int): Number of images generated for every prompt.
+
+    Returns:
+        List[Tuple[int, str, int]]: Tuples of the number of the first image, the prompt and the number of images.
+    """
+    per_request = 1 if get_env('GPT_IMAGE_MODEL', default_image_model) == 'dall-e-3' else max_images_per_request
+    requests = []
+    for index, request_prompt in enumerate(prompts):
+        for offset in range(0, count, per_request):
+            requests.append((index * count + offset + 1, request_prompt, min(per_request, count - offset)))
+    return requests
+
+
+def numbered_path(img_out: str, number: int) -> str:
+    """
+    Adds the image number to the output image path (e.g. "out.png" becomes "out-1.png").
+
+    Args:
+        img_out (str): The output image path.
+        number (int): The image number.
+
+    Returns:
+        str: The numbered output image path.
+    """
+    root, extension = os.path.splitext(img_out)
+    return f'{root}-{number}{extension}'
+
+
+def write_image(img: str, img_out: Optional[str]) -> None:
+    """
+    Decodes the base64 encoded image and writes it to the file or to stdout if no file is given.
+
+    The image is decoded and written block by block, so a decoded copy of the whole image is never held in memory.
+    A file is first written to a temporary file in the same directory and then renamed to the output path, so a
+    partially written image never appears at the output path.
+
+    Args:
+        img (str): The base64 encoded image.
+        img_out (Optional[str]): The output image path.
+    """
     if img_out is None:
         stdout = os.fdopen(sys.stdout.fileno(), "wb", closefd=False)
-        stdout.write(img)
+        write_base64(img, stdout)
         stdout.flush()
-    else:
-        img_dir = os.path.dirname(img_out)
-        if img_dir != '' and not os.path.exists(img_dir):
-            os.makedirs(img_dir, exist_ok=True)
-        image_file = open(img_out, 'wb')
-        image_file.write(img)
-        image_file.close()
+        return
+
+    img_dir = os.path.dirname(img_out)
+    if img_dir != '' and not os.path.exists(img_dir):
+        os.makedirs(img_dir, exist_ok=True)
+    # Unlike tempfile.mkstemp, the file is created with the permissions of a regularly written file
+    tmp_path = os.path.join(img_dir, f'.{os.path.basename(img_out)}.{uuid.uuid4().hex}.tmp')
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as image_file:
+            write_base64(img, image_file)
+        os.replace(tmp_path, img_out)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def write_base64(data: str, out: BinaryIO) -> None:
+    """
+    Decodes the base64 encoded data block by block into the binary stream.
+
+    Args:
+        data (str): The base64 encoded data.
+        out (BinaryIO): The stream the decoded data is written to.
+    """
+    for offset in range(0, len(data), decode_block_size):
+        out.write(base64.b64decode(data[offset:offset + decode_block_size]))
 
 
 if __name__ == '__main__':
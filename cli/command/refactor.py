@@ -1,12 +1,26 @@
-import glob
 import os
 import sys
-
-import openai
+from typing import List, Optional, Iterator
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from cli.core import ensure_api_key, read_stdin, valid_input, chatgpt_response, extract_prompt_and_file_args
+from cli.batch import run_batch
+from cli.cache import cache_key
+from cli.chunker import default_chunk_concurrency
+from cli.core import ensure_api_key, read_stdin, valid_input, chatgpt_response, extract_prompt_and_file_args, \
+    get_env, concurrent_map, extract_flag, build_response_request, count_tokens, shared_context, \
+    extract_context_files, MessageType
+from cli.manifest import RefactorManifest, file_hash, default_refactor_manifest
+from cli.metrics import usage_totals
+from cli.patch import PatchError, parse_edit_blocks, apply_edit_blocks, edit_blocks_instruction
+from cli.scanner import scan_files, default_max_file_size
+from cli.splitter import split_source, source_header
+
+default_refactor_mode = 'full'
+default_refactor_chunk_tokens = '0'
+default_input_price = '0.25'
+default_output_price = '2'
+full_content_instruction = 'Return only the full file content as a response!'
 
 
 def run():
@@ -14,14 +28,48 @@ def run():
     Run the gpt-refactor process to refactor code files.
 
     Usage:
-        gpt-refactor [api_key] [prompt] [file_pattern]
-    
+        gpt-refactor [api_key] [prompt] [file_pattern] [ctx=files] [--no-cache] [--batch] [--force] [--dry-run]
+
     This function reads input from standard input or command arguments,
     validates the input, and uses OpenAI's API to refactor the code
     within files matching the given file pattern.
     The function handles each file, sends its content to the OpenAI API,
     and writes the refactored code back to the original file.
 
+    Files are processed by a pool of workers whose size is set by the
+    'GPT_REFACTOR_CONCURRENCY' environment variable, and the results are
+    summarized in the order of the matched files once all of them are done.
+
+    Responses are cached on disk by the request content, so re-running the
+    same refactoring does not call the API again unless '--no-cache' is used.
+
+    Refactored files are recorded in a manifest in the working directory, so
+    files which were already refactored with the same prompt and were not
+    changed since are skipped. Use the '--force' flag to refactor all files.
+
+    When 'GPT_REFACTOR_MODE' is set to 'edits', only the changes are requested
+    as search/replace blocks, which are applied locally. If the edits can not
+    be applied, the full file content is requested instead.
+
+    When 'GPT_REFACTOR_CHUNK_TOKENS' is set, larger files are split at syntax
+    boundaries into parts which are refactored in parallel, together with
+    the start of the file as a shared context, and joined back in order.
+
+    With the '--batch' flag all files are refactored through the OpenAI Batch
+    API instead, and the files are written as batches complete. An interrupted
+    batch job is resumed by running the same command again.
+
+    Files are found lazily while the matched files are already being
+    refactored. Files ignored by .gitignore, version control and dependency
+    directories, lockfiles, binary files and files larger than
+    'GPT_REFACTOR_MAX_FILE_SIZE' are skipped. With the '--dry-run' flag the
+    files are only listed together with the estimated cost of the run.
+
+    With 'ctx=' reference files (comma separated paths or glob patterns, e.g.
+    project conventions or related modules) are read once, deduplicated,
+    trimmed to 'GPT_CONTEXT_TOKENS' tokens and sent as the same shared context
+    at the start of every request.
+
     If no input is provided, an error message is printed and the program exits.
     If file_pattern is not valid, it defaults to '*' to match all files.
 
@@ -31,7 +79,17 @@ def run():
 
     content = read_stdin()
 
-    prompt, file_pattern, key_in_args = extract_prompt_and_file_args(content is None)
+    no_cache = extract_flag(['--no-cache'])
+
+    batch = extract_flag(['--batch'])
+
+    force = extract_flag(['--force'])
+
+    dry_run = extract_flag(['--dry-run'])
+
+    extract_context_files()
+
+    prompt, file_pattern, _, key_in_args = extract_prompt_and_file_args(content is None)
 
     if not valid_input(prompt) and not valid_input(content):
         print('No input provided by either stdin nor command argument. '
@@ -41,50 +99,353 @@ def run():
     if not valid_input(file_pattern):
         file_pattern = '*'
 
-    openai.api_key = ensure_api_key(prompt=True, use_args_key=key_in_args)
+    concurrency = int(get_env('GPT_REFACTOR_CONCURRENCY', '1'))
+
+    edits = get_env('GPT_REFACTOR_MODE', default_refactor_mode).lower() == 'edits'
 
-    default_messages = [{'role': 'system', 'content': 'Return only the full file content as a response!'}]
+    prompt_messages = []
 
     if valid_input(content):
-        default_messages.append({'role': 'user', 'content': str(content)})
+        prompt_messages.append({'role': 'user', 'content': str(content)})
 
     if valid_input(prompt):
-        default_messages.append({'role': 'user', 'content': str(prompt)})
+        prompt_messages.append({'role': 'user', 'content': str(prompt)})
 
-    for file_path in glob.glob(file_pattern, recursive=True):
-        try:
-            if os.path.isfile(file_path):
-                messages = []
-                messages.extend(default_messages)
+    full_messages = [{'role': 'system', 'content': full_content_instruction}, *prompt_messages]
+    default_messages = [{'role': 'system', 'content': edit_blocks_instruction}, *prompt_messages] if edits \
+        else full_messages
+    fallback_messages = full_messages if edits else None
+
+    def refactor(file_path: str) -> None:
+        refactor_file(file_path, default_messages, no_cache, fallback_messages)
 
-                with open(file_path, 'r') as file:
-                    file_content = file.read()
-                    messages.append({'role': 'user', 'content': f'File content: {file_content}'})
+    manifest = RefactorManifest(get_env('GPT_REFACTOR_MANIFEST', default_refactor_manifest))
+    job = cache_key(build_response_request(default_messages))
 
-                print(f"Refactoring {file_path}...")
+    max_size = int(get_env('GPT_REFACTOR_MAX_FILE_SIZE', default_max_file_size))
 
-                response = chatgpt_response(messages)
-                if response is None:
-                    sys.exit(2)
+    file_paths = []
+    matched_files = []
+    input_hashes = {}
 
-                if isinstance(response, str):
-                    refactored_file = response
-                else:
-                    stream_content = ''
-                    for token in response:
-                        stream_content += token
-                    refactored_file = stream_content
+    def pending_files() -> Iterator[str]:
+        for file_path in scan_files(file_pattern, max_size,
+                                    on_skip=lambda path, reason: print(f'Skipping {path}, {reason}.')):
+            matched_files.append(file_path)
+            input_hashes[file_path] = file_hash(file_path)
+            if not force and manifest.is_done(job, file_path, input_hashes[file_path]):
+                print(f'Skipping {file_path}, already refactored with the same prompt.')
+            else:
+                file_paths.append(file_path)
+                yield file_path
 
-                if refactored_file.startswith('```'):
-                    refactored_file = refactored_file.strip('` \n').split('\n', 1)[1].strip()
+    if dry_run:
+        print_cost_estimate(pending_files(), default_messages, edits)
+        return
 
-                with open(file_path, 'w') as f:
-                    f.write(refactored_file)
+    ensure_api_key(prompt=True, use_args_key=key_in_args)
 
+    if batch:
+        def apply_result(file_path: str, text: Optional[str], error: Optional[str]) -> None:
+            if file_path not in input_hashes:
+                print(f'Skipping the batch result of {file_path}, the file is not refactored by this job.')
+            elif file_path not in file_paths:
+                print(f'Skipping the batch result of {file_path}, already refactored with the same prompt.')
+            elif error is None:
+                apply_refactoring(file_path, text, no_cache, fallback_messages)
+                manifest.record(job, file_path, input_hashes[file_path], file_hash(file_path))
                 print(f"Refactored {file_path} successfully.")
+            else:
+                print(f'Refactoring file {file_path} failed with error: {error}')
+
+        run_batch('refactor', job, list(pending_files()),
+                  lambda file_path: build_file_messages(file_path, default_messages), apply_result, matched_files)
+        return
+
+    failed = {}
+    for index, file_path, future in concurrent_map(refactor, pending_files(), concurrency):
+        try:
+            future.result()
+            manifest.record(job, file_path, input_hashes[file_path], file_hash(file_path))
+            print(f"Refactored {file_path} successfully.")
         except Exception as e:
+            failed[index] = e
             print(f'Refactoring file {file_path} failed with error: {e}')
 
+    if concurrency > 1 and len(file_paths) > 0:
+        print(f'\nRefactored {len(file_paths) - len(failed)} of {len(file_paths)} files.')
+        for index, file_path in enumerate(file_paths):
+            if index in failed:
+                print(f'Failed: {file_path} ({failed[index]})')
+
+    usage = usage_totals.summary()
+    if usage:
+        print(usage)
+
+
+def print_cost_estimate(file_paths: Iterator[str], default_messages: List[MessageType], edits: bool) -> None:
+    """
+    Lists the files which would be refactored and estimates the cost of refactoring them.
+
+    Input tokens are counted for the file content and the prompt of every request. Output tokens are estimated as
+    the size of the file, or a quarter of it when only the edits are requested, and reasoning tokens are not
+    included, so the estimate is only a rough lower bound. Prices are read from the 'GPT_INPUT_PRICE' and
+    'GPT_OUTPUT_PRICE' environment variables in USD per million tokens.
+
+    Args:
+        file_paths (Iterator[str]): The paths of the files which would be refactored.
+        default_messages (List[MessageType]): The messages sent before the file content.
+        edits (bool): Whether only the edits are requested.
+    """
+    input_price = float(get_env('GPT_INPUT_PRICE', default_input_price))
+    output_price = float(get_env('GPT_OUTPUT_PRICE', default_output_price))
+    _, context_tokens, _ = shared_context()
+    prompt_tokens = context_tokens + sum(count_tokens(message['content']) for message in default_messages)
+
+    files = 0
+    input_tokens = 0
+    output_tokens = 0
+    for file_path in file_paths:
+        with open(file_path, 'r') as file:
+            tokens = count_tokens(file.read())
+        files += 1
+        input_tokens += prompt_tokens + tokens
+        output_tokens += tokens // 4 if edits else tokens
+        print(f'{tokens:>10} tokens  {file_path}')
+
+    cost = (input_tokens * input_price + output_tokens * output_price) / 1000000
+    print(f'\n{files} files, {input_tokens} input tokens, ~{output_tokens} output tokens, '
+          f'estimated cost ${cost:.4f}')
+
+
+def refactor_file(file_path: str, default_messages: List[MessageType], no_cache: bool = False,
+                  fallback_messages: Optional[List[MessageType]] = None) -> None:
+    """
+    Refactors a single file and writes the response content back to it.
+
+    Args:
+        file_path (str): The path of the file to refactor.
+        default_messages (List[MessageType]): The messages sent before the file content.
+        no_cache (bool, optional): Whether to bypass the response cache. Defaults to False.
+        fallback_messages (Optional[List[MessageType]], optional): If given, the response is applied as edit blocks
+                                                                   and these messages are used to request the full
+                                                                   file content when the edits can not be applied.
+                                                                   Defaults to None.
+
+    Raises:
+        SystemExit: If the OpenAI API did not return a response.
+    """
+    chunk_tokens = int(get_env('GPT_REFACTOR_CHUNK_TOKENS', default_refactor_chunk_tokens))
+    if chunk_tokens > 0:
+        with open(file_path, 'r') as file:
+            file_content = file.read()
+        if count_tokens(file_content) > chunk_tokens:
+            refactor_file_parts(file_path, file_content, chunk_tokens, default_messages, no_cache, fallback_messages)
+            return
+
+    messages = build_file_messages(file_path, default_messages)
+
+    print(f"Refactoring {file_path}...")
+
+    response = chatgpt_response(messages, use_cache=True, refresh_cache=no_cache)
+    if response is None:
+        sys.exit(2)
+
+    if isinstance(response, str):
+        refactored_file = response
+    else:
+        refactored_file = ''.join(response)
+
+    apply_refactoring(file_path, refactored_file, no_cache, fallback_messages)
+
+
+def apply_refactoring(file_path: str, text: str, no_cache: bool = False,
+                      fallback_messages: Optional[List[MessageType]] = None) -> None:
+    """
+    Applies the response to the file, either as the full file content or as edit blocks.
+
+    Args:
+        file_path (str): The path of the refactored file.
+        text (str): The response text.
+        no_cache (bool, optional): Whether to bypass the response cache for the fallback request. Defaults to False.
+        fallback_messages (Optional[List[MessageType]], optional): If given, the response is applied as edit blocks
+                                                                   and these messages are used to request the full
+                                                                   file content when the edits can not be applied.
+                                                                   Defaults to None.
+    """
+    if fallback_messages is None:
+        write_refactored_file(file_path, text)
+        return
+
+    with open(file_path, 'r') as file:
+        file_content = file.read()
+
+    try:
+        edited_content = apply_edits(file_content, text)
+    except PatchError as e:
+        print(f'Applying edits to {file_path} failed ({e}), requesting the full file content...')
+        refactor_file(file_path, fallback_messages, no_cache)
+        return
+
+    if edited_content != file_content:
+        with open(file_path, 'w') as f:
+            f.write(edited_content)
+
+
+def refactor_file_parts(file_path: str, file_content: str, chunk_tokens: int, default_messages: List[MessageType],
+                        no_cache: bool = False, fallback_messages: Optional[List[MessageType]] = None) -> None:
+    """
+    Refactors a large file in parts and writes the joined parts back to it.
+
+    The file is split at syntax boundaries, and the parts are refactored concurrently, every one of them together with
+    the start of the file (e.g. the imports) as a shared context. The file is written only if all parts succeed.
+
+    Args:
+        file_path (str): The path of the file to refactor.
+        file_content (str): The current file content.
+        chunk_tokens (int): Maximum number of tokens per part.
+        default_messages (List[MessageType]): The messages sent before the file content.
+        no_cache (bool, optional): Whether to bypass the response cache. Defaults to False.
+        fallback_messages (Optional[List[MessageType]], optional): If given, the responses are applied as edit
+                                                                   blocks and these messages are used to request the
+                                                                   full part content when the edits can not be
+                                                                   applied. Defaults to None.
+
+    Raises:
+        SystemExit: If the OpenAI API did not return a response.
+    """
+    parts = split_source(file_content, file_path, chunk_tokens)
+    header = source_header(file_content, file_path, chunk_tokens // 4)
+    concurrency = int(get_env('GPT_CHUNK_CONCURRENCY', default_chunk_concurrency))
+
+    print(f"Refactoring {file_path} in {len(parts)} parts...")
+
+    # The start of the file is shared by all parts, so it is sent before the part specific message
+    header_messages = [{'role': 'user', 'content': f'The start of the file, for context only:\n{header}'}] \
+        if header != '' else []
+
+    def refactor_part(index: int, part: str) -> str:
+        context = f'The file is too large to be refactored at once, so it is split into {len(parts)} parts and the ' \
+                  f'file content below is only part {index + 1}. Refactor and return only this part.'
+        context_messages = [*header_messages, {'role': 'user', 'content': context}]
+        return refactor_content(part, [*default_messages, *context_messages], no_cache,
+                                [*fallback_messages, *context_messages] if fallback_messages is not None else None)
+
+    refactored_parts = {}
+    for index, _, future in concurrent_map(lambda item: refactor_part(*item), enumerate(parts), concurrency):
+        refactored_parts[index] = future.result()
+
+    refactored_file = ''.join(refactored_parts[index] for index in range(len(parts)))
+    if refactored_file != file_content:
+        with open(file_path, 'w') as f:
+            f.write(refactored_file)
+
+
+def refactor_content(content: str, default_messages: List[MessageType], no_cache: bool = False,
+                     fallback_messages: Optional[List[MessageType]] = None) -> str:
+    """
+    Refactors the content and returns the result without writing it.
+
+    Args:
+        content (str): The content to refactor.
+        default_messages (List[MessageType]): The messages sent before the content.
+        no_cache (bool, optional): Whether to bypass the response cache. Defaults to False.
+        fallback_messages (Optional[List[MessageType]], optional): If given, the response is applied as edit blocks
+                                                                   and these messages are used to request the full
+                                                                   content when the edits can not be applied.
+                                                                   Defaults to None.
+
+    Returns:
+        str: The refactored content, ending with a line break if the original content does.
+
+    Raises:
+        SystemExit: If the OpenAI API did not return a response.
+    """
+    messages = [*default_messages, {'role': 'user', 'content': f'File content: {content}'}]
+    response = chatgpt_response(messages, use_cache=True, refresh_cache=no_cache)
+    if response is None:
+        sys.exit(2)
+
+    text = response if isinstance(response, str) else ''.join(response)
+    if fallback_messages is not None:
+        try:
+            return apply_edits(content, text)
+        except PatchError:
+            return refactor_content(content, fallback_messages, no_cache)
+
+    refactored = strip_code_block(text)
+    if content.endswith('\n') and not refactored.endswith('\n'):
+        refactored += '\n'
+    return refactored
+
+
+def apply_edits(content: str, text: str) -> str:
+    """
+    Applies the edit blocks from the response text to the content.
+
+    Args:
+        content (str): The current content.
+        text (str): The response text with the edit blocks.
+
+    Returns:
+        str: The edited content.
+
+    Raises:
+        PatchError: If the response contains no edit blocks, or they can not be applied.
+    """
+    blocks = parse_edit_blocks(text)
+    if len(blocks) == 0 and text.strip() != '':
+        raise PatchError('No edit blocks found in the response')
+    return apply_edit_blocks(content, blocks)
+
+
+def build_file_messages(file_path: str, default_messages: List[MessageType]) -> List[MessageType]:
+    """
+    Builds the messages for refactoring the file.
+
+    Args:
+        file_path (str): The path of the file to refactor.
+        default_messages (List[MessageType]): The messages sent before the file content.
+
+    Returns:
+        List[MessageType]: The default messages followed by the file content.
+    """
+    messages = []
+    messages.extend(default_messages)
+
+    with open(file_path, 'r') as file:
+        file_content = file.read()
+        messages.append({'role': 'user', 'content': f'File content: {file_content}'})
+
+    return messages
+
+
+def write_refactored_file(file_path: str, refactored_file: str) -> None:
+    """
+    Writes the refactored content to the file, removing the markdown code block around it if present.
+
+    Args:
+        file_path (str): The path of the refactored file.
+        refactored_file (str): The refactored file content.
+    """
+    with open(file_path, 'w') as f:
+        f.write(strip_code_block(refactored_file))
+
+
+def strip_code_block(text: str) -> str:
+    """
+    Removes the markdown code block around the text if present.
+
+    Args:
+        text (str): The response text.
+
+    Returns:
+        str: The text without the code block.
+    """
+    if text.startswith('```'):
+        text = text.strip('` \n').split('\n', 1)[1].strip()
+    return text
+
 
 if __name__ == '__main__':
     run()
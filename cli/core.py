@@ -1,19 +1,29 @@
-import base64
+import functools
+import importlib.util
+import itertools
 import os
+import stat
 import sys
-from typing import List, TypedDict, Union, Optional, Tuple, Iterable
-
-from dotenv import load_dotenv
-from openai import OpenAI, APIError, AuthenticationError, BadRequestError, RateLimitError
+import threading
+from typing import List, TypedDict, Union, Optional, Tuple, Iterable, Iterator, Callable, TypeVar, Any, TextIO, \
+    TYPE_CHECKING
 
 from cli import __version__
-
+from cli.cache import ResponseCache, cache_key
+from cli.mapped import MappedInput
+from cli.metrics import MetricsRecorder, trace_request, usage_totals, default_metrics, default_metrics_summary
+from cli.ratelimit import rate_limiter, retry_request, default_max_retries
+from cli.scanner import scan_files
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+    from openai import OpenAI
+
+# Heavy modules (openai, httpx, dotenv) are imported on first use, so that short-lived invocations like
+# '--version' or the missing input error don't pay for them
 home_env_file = os.path.expanduser('~') + '/.chatgpt-cli/.env'
 env_file = os.getcwd() + '/.env'
 
-load_dotenv(home_env_file)
-load_dotenv(env_file)
-
 default_model = 'gpt-5-mini'
 default_reasoning_effort = 'low'
 default_temperature = '1'
@@ -21,8 +31,28 @@ default_stream_response = 'true'
 default_system_desc = 'You are a very direct and straight-to-the-point assistant.'
 default_image_model = 'gpt-image-1'
 default_image_size = '1024x1024'
+default_cache = 'true'
+default_cache_ttl = '86400'
+default_cache_max_size = '100'
+default_cache_dir = os.path.expanduser('~') + '/.chatgpt-cli/cache'
+default_http2 = 'true'
+default_http_max_connections = '100'
+default_http_max_keepalive = '20'
+default_http_keepalive_expiry = '60'
+default_context_file = ''
+default_context_tokens = '20000'
+default_prompt_cache_key = 'auto'
 
 MessageType = TypedDict('MessageType', {'role': str, 'content': str})
+SharedContextType = Tuple[Tuple[MessageType, ...], int, str]
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+configured_api_key: Optional[str] = None
+configured_context_files: Tuple[str, ...] = ()
+client_instance: Optional['OpenAI'] = None
+client_lock = threading.Lock()
 
 
 def ensure_api_key(default: str = None, prompt: bool = False, use_args_key: bool = True) -> str:
@@ -38,6 +68,8 @@ def ensure_api_key(default: str = None, prompt: bool = False, use_args_key: bool
         prompt (bool, optional): Whether to prompt for the key if not found. Defaults to False.
         use_args_key (bool, optional): Whether to use the API key provided as a command line argument. Defaults to True.
 
+    The returned key is also used by the shared OpenAI client.
+
     Returns:
         str: The OpenAI API key.
     """
@@ -79,7 +111,9 @@ def ensure_api_key(default: str = None, prompt: bool = False, use_args_key: bool
                 f.write(f'OPENAI_API_KEY={api_key}')
                 print(f'API key saved in {home_env_file}\n')
 
-    return api_key if valid_input(api_key) else default
+    global configured_api_key
+    configured_api_key = api_key if valid_input(api_key) else default
+    return configured_api_key
 
 
 def check_args_for_key() -> Tuple[bool, str]:
@@ -107,6 +141,38 @@ def check_args_for_key() -> Tuple[bool, str]:
     return key_in_args, value
 
 
+def open_stdin() -> Union[TextIO, MappedInput, None]:
+    """
+    Opens standard input (stdin) as a text stream without reading it.
+
+    Input redirected from a regular file is memory mapped, so its size and digest are available without reading it
+    and the text is decoded only as it is read, while pipes are read as a regular text stream.
+
+    Returns:
+        Union[TextIO, MappedInput, None]: The stdin text stream or None if no content is available (e.g. stdin is a
+                                          terminal or an empty file).
+    """
+    if stat.S_ISREG(os.fstat(0).st_mode):
+        if os.fstat(0).st_size <= os.lseek(0, 0, os.SEEK_CUR):
+            return None
+        try:
+            return MappedInput(0)
+        except (OSError, ValueError):
+            pass
+    f = open(0, 'r', encoding='utf-8', closefd=False)
+    if f.seekable():
+        f.seek(0, os.SEEK_CUR)
+        old_file_position = f.tell()
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(old_file_position, os.SEEK_SET)
+        if size > 0:
+            return f
+    elif not sys.stdin.isatty():
+        return f
+    return None
+
+
 def read_stdin() -> Union[str, None]:
     """
     Reads input from standard input (stdin).
@@ -119,24 +185,59 @@ def read_stdin() -> Union[str, None]:
     """
     content = None
     try:
-        f = open(0, 'r', encoding='utf-8')
-        if f.seekable():
-            f.seek(0, os.SEEK_CUR)
-            old_file_position = f.tell()
-            f.seek(0, os.SEEK_END)
-            size = f.tell()
-            f.seek(old_file_position, os.SEEK_SET)
-            if size > 0:
-                content = f.read()
-        else:
-            if not sys.stdin.isatty():
-                content = sys.stdin.read()
+        f = open_stdin()
+        if f is not None:
+            content = f.read()
+            if isinstance(f, MappedInput):
+                f.close()
     except Exception as e:
         print(f'Error on stdin input: {e}')
         pass
     return content
 
 
+def extract_flag(names: List[str]) -> bool:
+    """
+    Extracts a flag from the command line arguments.
+
+    This function removes every occurrence of the given flag names from the command line arguments, so they don't
+    interfere with the positional arguments parsing.
+
+    Args:
+        names (List[str]): The names of the flag (e.g. ['--no-cache']).
+
+    Returns:
+        bool: True if the flag was present in the arguments, otherwise False.
+    """
+    found = False
+    for arg in list(sys.argv[1:]):
+        if arg in names:
+            sys.argv.remove(arg)
+            found = True
+    return found
+
+
+def extract_option(name: str) -> Optional[str]:
+    """
+    Extracts a "name=value" option from the command line arguments.
+
+    This function removes every occurrence of the option from the command line arguments, so it doesn't interfere
+    with the positional arguments parsing. If the option is given more than once, the last value is used.
+
+    Args:
+        name (str): The name of the option (e.g. 'n').
+
+    Returns:
+        Optional[str]: The value of the option or None if the option was not present in the arguments.
+    """
+    value = None
+    for arg in list(sys.argv[1:]):
+        if arg.startswith(f'{name}='):
+            sys.argv.remove(arg)
+            value = arg[len(name) + 1:]
+    return value
+
+
 def extract_prompt_and_file_args(no_content: bool = False) -> Tuple[str, str, List[str], bool]:
     """
     Extracts the prompt and file arguments from the command line.
@@ -199,15 +300,251 @@ def extract_prompt_and_file_args(no_content: bool = False) -> Tuple[str, str, Li
     return prompt, file_path, input_files, key_in_args
 
 
-def chatgpt_response(messages: List[MessageType]) -> Union[str, Iterable[str], None]:
+def get_client() -> 'OpenAI':
+    """
+    Returns the OpenAI client shared by all commands.
+
+    The client is created lazily on the first call and then cached, so repeated requests reuse warm HTTP
+    connections instead of opening new ones. Connection pool limits and keep-alive expiry are configurable through
+    environment variables, and HTTP/2 is used when enabled and the 'h2' package is installed. Retries are disabled
+    in the client, because requests are retried by the shared rate limiter, which also reads the rate limit headers
+    of every response. The connections of measured requests are traced for the performance metrics.
+
+    Returns:
+        OpenAI: The shared OpenAI client.
+    """
+    global client_instance
+    if client_instance is None:
+        with client_lock:
+            if client_instance is None:
+                import httpx
+                from openai import OpenAI, DefaultHttpxClient
+
+                http2 = (icase_contains(get_env('GPT_HTTP2', default_http2), ['true', 'yes', 'on']) and
+                         importlib.util.find_spec('h2') is not None)
+                limits = httpx.Limits(
+                    max_connections=int(get_env('GPT_HTTP_MAX_CONNECTIONS', default_http_max_connections)),
+                    max_keepalive_connections=int(get_env('GPT_HTTP_MAX_KEEPALIVE', default_http_max_keepalive)),
+                    keepalive_expiry=float(get_env('GPT_HTTP_KEEPALIVE_EXPIRY', default_http_keepalive_expiry)))
+                client_instance = OpenAI(api_key=configured_api_key, max_retries=0,
+                                         http_client=DefaultHttpxClient(
+                                             limits=limits, http2=http2,
+                                             event_hooks={'request': [trace_request],
+                                                          'response': [rate_limiter.on_response]}))
+    return client_instance
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Returns the on-disk response cache configured by the environment variables.
+
+    Returns:
+        Optional[ResponseCache]: The response cache or None if caching is disabled.
+    """
+    if not icase_contains(get_env('GPT_CACHE', default_cache), ['true', 'yes', 'on']):
+        return None
+    directory = os.path.expanduser(get_env('GPT_CACHE_DIR', default_cache_dir))
+    ttl = float(get_env('GPT_CACHE_TTL', default_cache_ttl))
+    max_size = int(float(get_env('GPT_CACHE_MAX_SIZE', default_cache_max_size)) * 1024 * 1024)
+    return ResponseCache(directory, ttl, max_size)
+
+
+@functools.lru_cache(maxsize=1)
+def get_metrics_recorder() -> Optional[MetricsRecorder]:
+    """
+    Returns the performance metrics recorder configured by the environment variables.
+
+    Returns:
+        Optional[MetricsRecorder]: The metrics recorder or None if the metrics are disabled.
+    """
+    target = get_env('GPT_METRICS', default_metrics)
+    summary = icase_contains(get_env('GPT_METRICS_SUMMARY', default_metrics_summary), ['true', 'yes', 'on'])
+    if target == '' and not summary:
+        return None
+    return MetricsRecorder(target, summary)
+
+
+def extract_context_files() -> None:
+    """
+    Extracts the "ctx=" option from the command line arguments and uses its files as the shared context.
+
+    The option value is a comma separated list of file paths or glob patterns (e.g. "ctx=docs/style.md,src/*.py").
+    The files are added to the shared context of every request, after the 'GPT_CONTEXT_FILE' file.
+    """
+    global configured_context_files
+    value = extract_option('ctx')
+    if value is not None:
+        configured_context_files = tuple(pattern for pattern in value.split(',') if valid_input(pattern))
+
+
+def shared_context() -> SharedContextType:
+    """
+    Returns the shared context sent at the start of every request, assembled from the 'GPT_CONTEXT_FILE' file and
+    the files of the "ctx=" option.
+
+    Returns:
+        SharedContextType: The context messages, their number of tokens and the digest of their content.
+    """
+    return load_shared_context(get_env('GPT_CONTEXT_FILE', default_context_file), configured_context_files,
+                               int(get_env('GPT_CONTEXT_TOKENS', default_context_tokens)))
+
+
+@functools.lru_cache(maxsize=None)
+def load_shared_context(context_file: str, context_patterns: Tuple[str, ...], max_tokens: int) -> SharedContextType:
+    """
+    Reads the context files and assembles them into the shared context message.
+
+    The files are read and assembled only once per process, so every request sends the same, byte-identical
+    message, and its token count and digest are computed only once. Files which are given more than once or which
+    have the same content are included only once. Files are included in the given order until the token budget is
+    used up, and the last included file is shortened to whole lines which fit into the budget.
+
+    Args:
+        context_file (str): The path of the context file included as it is ('' - no context file).
+        context_patterns (Tuple[str, ...]): The paths or glob patterns of the files included with their paths.
+        max_tokens (int): Maximum number of tokens of the files (0 - unlimited).
+
+    Returns:
+        SharedContextType: The context messages, their number of tokens and the digest of their content.
+
+    Raises:
+        SystemExit: If a context file can not be read or a pattern matches no files.
+    """
+    paths = [context_file] if context_file != '' else []
+    for pattern in context_patterns:
+        matched = list(scan_files(pattern))
+        if len(matched) == 0:
+            print(f'No context files match "{pattern}"')
+            sys.exit(1)
+        paths.extend(matched)
+
+    sections = []
+    used_tokens = 0
+    left_out = []
+    seen_paths = set()
+    seen_contents = set()
+    for path in paths:
+        real_path = os.path.realpath(os.path.expanduser(path))
+        if real_path in seen_paths:
+            continue
+        seen_paths.add(real_path)
+        if 0 < max_tokens <= used_tokens:
+            left_out.append(path)
+            continue
+
+        try:
+            with open(real_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f'Context file can not be read: {e}')
+            sys.exit(1)
+        content_key = cache_key(text)
+        if not valid_input(text) or content_key in seen_contents:
+            continue
+        seen_contents.add(content_key)
+
+        section = text if path == context_file else f'File: {path}\n{text}'
+        tokens = count_tokens(section)
+        if 0 < max_tokens < used_tokens + tokens:
+            section = truncate_tokens(section, max_tokens - used_tokens)
+            tokens = max_tokens - used_tokens
+            if section == '':
+                left_out.append(path)
+                continue
+            section = section.rstrip('\n') + '\n[...]'
+        sections.append(section.rstrip('\n'))
+        used_tokens += tokens
+
+    if len(left_out) > 0 or used_tokens >= max_tokens > 0:
+        print(f'Shared context trimmed to {max_tokens} tokens' +
+              (f', left out: {", ".join(left_out)}' if len(left_out) > 0 else ''), file=sys.stderr)
+    if len(sections) == 0:
+        return (), 0, ''
+    message = {'role': 'developer', 'content': 'Shared context:\n\n' + '\n\n'.join(sections)}
+    return (message,), count_tokens(message['content']), cache_key(message['content'])
+
+
+def build_response_request(messages: List[MessageType], include_context: bool = True) -> dict:
+    """
+    Builds the Responses API request parameters for the given messages.
+
+    The model, reasoning effort, temperature and instructions are read from the environment variables, so
+    synchronous and batch requests are always built the same way.
+
+    The input starts with the parts shared by many requests, so that the API can reuse its prompt cache for them:
+    the instructions are followed by the shared context file and only then by the messages, which callers order
+    from the most to the least shared (e.g. the refactoring instructions before the file content). Requests with
+    the same instructions, context and leading system messages are sent with the same prompt cache key, so they
+    are routed to the same cache.
+
+    Args:
+        messages (List[MessageType]): A list of message dictionaries containing role and content.
+        include_context (bool, optional): Whether the shared context is sent before the messages. Requests which
+                                          continue a server-side conversation leave it out, because it is already
+                                          part of the conversation. Defaults to True.
+
+    Returns:
+        dict: The request parameters.
+    """
+    model = get_env('GPT_MODEL', default_model)
+    reasoning_effort = get_env('GPT_REASONING_EFFORT', default_reasoning_effort)
+    temperature = float(get_env('GPT_TEMPERATURE', default_temperature))
+    system_desc = get_env('GPT_SYSTEM_DESC', default_system_desc)
+
+    context_messages, _, context_digest = shared_context()
+
+    if not include_context:
+        context_messages = []
+
+    request = {'model': model, 'temperature': temperature, 'input': [*context_messages, *messages],
+               'instructions': system_desc}
+    if model.startswith('gpt-5'):
+        request['reasoning'] = {'effort': reasoning_effort}
+
+    prompt_cache_key = get_env('GPT_PROMPT_CACHE_KEY', default_prompt_cache_key)
+    if prompt_cache_key.lower() == 'auto':
+        leading_messages = list(itertools.takewhile(lambda message: message['role'] in ['system', 'developer'],
+                                                    messages))
+        prompt_cache_key = 'chatgpt-cli-' + cache_key({'model': model, 'instructions': system_desc,
+                                                       'context': context_digest, 'prefix': leading_messages})[:16]
+    if not icase_contains(prompt_cache_key, ['false', 'no', 'off']):
+        request['prompt_cache_key'] = prompt_cache_key
+    return request
+
+
+def chatgpt_response(messages: List[MessageType], use_cache: bool = False, refresh_cache: bool = False,
+                     previous_response_id: Optional[str] = None,
+                     on_response: Optional[Callable[[Any], None]] = None) -> Union[str, Iterable[str], None]:
     """
     Sends a chat message to the GPT model and retrieves the response.
 
     This function takes a list of messages, sends them to the OpenAI ChatCompletion API,
     and returns the response. It supports both streaming and non-streaming responses.
 
+    When caching is used, the response is looked up in the on-disk cache by the hash of the model, instructions,
+    temperature, reasoning effort and messages. Cached responses are replayed through the same streaming iterator
+    interface when streaming is enabled.
+
+    The token usage of every completed response is added to the process-wide usage totals, so commands can report
+    how many input tokens were read from the prompt cache.
+
+    When the performance metrics are enabled, the latency, time to first token, throughput, token usage and retries of
+    the request are recorded once the response is completely received.
+
+    When the previous response ID is provided, the conversation is continued on the server side, so only the new
+    messages have to be sent, without the shared context which the conversation already contains. If the server
+    rejects the request (e.g. the previous response expired), None is returned, so the caller can send the whole
+    conversation instead.
+
     Args:
         messages (List[MessageType]): A list of message dictionaries containing role and content.
+        use_cache (bool, optional): Whether to answer from and store responses in the cache. Defaults to False.
+        refresh_cache (bool, optional): Whether to skip the cache lookup and only store the new response.
+                                        Defaults to False.
+        previous_response_id (Optional[str], optional): The ID of the response the conversation continues from.
+                                                        Defaults to None.
+        on_response (Optional[Callable[[Any], None]], optional): Called with the completed API response object
+                                                                 (not called for cached responses). Defaults to None.
 
     Returns:
         Union[str, Iterable[str], None]: The response from the API as a string if not streaming, 
@@ -218,32 +555,85 @@ def chatgpt_response(messages: List[MessageType]) -> Union[str, Iterable[str], N
         print('No messages provided')
         return None
 
-    model = get_env('GPT_MODEL', default_model)
-    reasoning_effort = get_env('GPT_REASONING_EFFORT', default_reasoning_effort)
-    temperature = float(get_env('GPT_TEMPERATURE', default_temperature))
     stream = icase_contains(get_env('GPT_STREAM_RESPONSE', default_stream_response), ['true', 'yes', 'on'])
-    system_desc = get_env('GPT_SYSTEM_DESC', default_system_desc)
-
-    reasoning = {'effort': reasoning_effort}
-    if not model.startswith('gpt-5'):
-        reasoning = None
+    request = build_response_request(messages, include_context=previous_response_id is None)
+    _, context_tokens, context_digest = shared_context()
+    if previous_response_id:
+        context_tokens = 0
+    recorder = get_metrics_recorder()
+
+    cache = get_response_cache() if use_cache else None
+    key = None
+    if cache:
+        key = cache_key({'model': request['model'], 'instructions': request['instructions'],
+                         'temperature': request['temperature'], 'reasoning': request.get('reasoning'),
+                         'context': context_digest, 'messages': messages})
+        cached_text = cache.get(key) if not refresh_cache else None
+        if cached_text is not None:
+            if recorder:
+                recorder.start('responses', request['model']).finish('cached')
+            if not stream:
+                return cached_text
+            return iter(cached_text.splitlines(keepends=True))
+
+    from openai import APIError, AuthenticationError, BadRequestError, RateLimitError
+
+    request_args = {}
+    if previous_response_id:
+        request_args['previous_response_id'] = previous_response_id
+
+    max_retries = int(get_env('GPT_MAX_RETRIES', default_max_retries))
+    tokens = context_tokens + sum(count_tokens(message['content']) for message in messages)
+    metrics = None
 
     try:
-        client = OpenAI()
-        response = client.responses.create(model=model, reasoning=reasoning, temperature=temperature, input=messages,
-                                           instructions=system_desc, stream=stream)
+        client = get_client()
+        metrics = recorder.start('responses', request['model']) if recorder else None
+        response = retry_request(lambda: client.responses.create(**request, stream=stream, **request_args),
+                                 'responses', tokens, max_retries, metrics)
+        if metrics:
+            metrics.response_received(stream)
         if not stream:
-            return response.output[0].content[0].text.strip('\n')
+            usage_totals.add(response.usage)
+            if metrics:
+                metrics.set_usage(response.usage)
+                metrics.finish()
+            if on_response:
+                on_response(response)
+            text = response.output_text.strip('\n')
+            if cache:
+                cache.set(key, text)
+            return text
 
         def stream_response() -> Iterable[str]:
-            for event in response:
-                if event.type == 'response.output_text.delta':
-                    yield event.delta
+            deltas = []
+            completed = False
+            try:
+                for event in response:
+                    if event.type == 'response.output_text.delta':
+                        if metrics:
+                            metrics.first_token()
+                        if cache:
+                            deltas.append(event.delta)
+                        yield event.delta
+                    elif event.type == 'response.completed':
+                        usage_totals.add(event.response.usage)
+                        if metrics:
+                            metrics.set_usage(event.response.usage)
+                        if on_response:
+                            on_response(event.response)
+                completed = True
+            except APIError as e:
+                if metrics:
+                    metrics.finish(error=e)
+                raise
+            finally:
+                if metrics:
+                    metrics.finish('ok' if completed else 'incomplete')
+            if cache:
+                cache.set(key, ''.join(deltas))
 
         return stream_response()
-    except APIError as e:
-        print(f'OpenAI API returned an API Error: {e}')
-        return None
     except AuthenticationError as e:
         print(f'Invalid ApiKey: {e}')
         sys.exit(4)
@@ -251,22 +641,32 @@ def chatgpt_response(messages: List[MessageType]) -> Union[str, Iterable[str], N
         print(f'OpenAI API request exceeded rate limit: {e}')
         return None
     except BadRequestError as e:
+        if previous_response_id:
+            print(f'Failed to continue the conversation on the server, sending the local history instead: {e}')
+            return None
         print(f'Invalid request: {e}')
         sys.exit(5)
+    except APIError as e:
+        print(f'OpenAI API returned an API Error: {e}')
+        return None
 
 
-def image_bytes_response(prompt: str, input_images: List[str]) -> Union[bytes, None]:
+def image_base64_response(prompt: str, input_images: List[str], n: int = 1) -> Union[List[str], None]:
     """
-    Generates an image URL based on the given prompt.
+    Generates images based on the given prompt.
 
-    This function sends the prompt to OpenAI's image generation API and retrieves the bytes of the generated image.
+    This function sends the prompt to OpenAI's image generation API and retrieves the base64 encoded generated
+    images. The images are returned encoded, so they can be decoded block by block while they are written instead of
+    holding a second, decoded copy of every image in memory. The input images are opened for this request only, so
+    the function can be called from multiple threads at once.
 
     Args:
         prompt (str): The prompt for which to generate an image.
         input_images (List[str]): The list of images that should be used for generating a new image.
+        n (int, optional): Number of images to generate in a single request. Defaults to 1.
 
     Returns:
-        Union[bytes, None]: The bytes of the generated image or None in case of errors.
+        Union[List[str], None]: The base64 encoded generated images or None in case of errors.
     """
     if prompt is None:
         print('Prompt not provided')
@@ -275,32 +675,43 @@ def image_bytes_response(prompt: str, input_images: List[str]) -> Union[bytes, N
     image_model = get_env('GPT_IMAGE_MODEL', default_image_model)
     image_size = get_env('GPT_IMAGE_SIZE', default_image_size)
 
-    img_args = {'model': image_model, 'prompt': prompt, 'n': 1, 'size': image_size, 'response_format': 'b64_json'}
+    img_args = {'model': image_model, 'prompt': prompt, 'n': n, 'size': image_size, 'response_format': 'b64_json'}
     if image_model.startswith('gpt-image'):
         del img_args['response_format']
 
-    images = None
+    images = []
     if len(input_images) > 0:
         if image_model == 'dall-e-2':
             # dall-e-2 model only supports one input image
-            images = open(input_images[0], 'rb')
+            images = [open(input_images[0], 'rb')]
         elif image_model == 'dall-e-3':
             # dall-e-3 model does not support any input images
             images = []
         else:
             images = [open(img, 'rb') for img in input_images]
 
-    try:
-        client = OpenAI()
+    from openai import APIError, AuthenticationError, BadRequestError, RateLimitError
+
+    def send_request():
         if images:
-            response = client.images.edit(**img_args, image=images)
-        else:
-            response = client.images.generate(**img_args)
-        image_base64 = response.data[0].b64_json
-        return base64.b64decode(image_base64)
-    except APIError as e:
-        print(f'OpenAI API returned an API Error: {e}')
-        return None
+            # A retried request uploads the input images again from the start
+            for image in images:
+                image.seek(0)
+            return client.images.edit(**img_args, image=images[0] if image_model == 'dall-e-2' else images)
+        return client.images.generate(**img_args)
+
+    recorder = get_metrics_recorder()
+    max_retries = int(get_env('GPT_MAX_RETRIES', default_max_retries))
+
+    try:
+        client = get_client()
+        metrics = recorder.start('images', image_model) if recorder else None
+        response = retry_request(send_request, 'images', max_retries=max_retries, metrics=metrics)
+        if metrics:
+            metrics.response_received(False)
+            metrics.set_usage(getattr(response, 'usage', None))
+            metrics.finish()
+        return [image.b64_json for image in response.data]
     except AuthenticationError as e:
         print(f'Invalid ApiKey: {e}')
         sys.exit(4)
@@ -310,6 +721,115 @@ def image_bytes_response(prompt: str, input_images: List[str]) -> Union[bytes, N
     except BadRequestError as e:
         print(f'Invalid request: {e}')
         sys.exit(5)
+    except APIError as e:
+        print(f'OpenAI API returned an API Error: {e}')
+        return None
+    finally:
+        for image in images:
+            image.close()
+
+
+def concurrent_map(func: Callable[[T], R], items: Iterable[T],
+                   concurrency: int) -> Iterator[Tuple[int, T, 'Future']]:
+    """
+    Runs the function for every item using a bounded pool of worker threads.
+
+    Items are consumed lazily, so no more than twice the number of workers are scheduled at any time. Finished
+    futures are yielded in completion order together with the index and the item they were created for.
+
+    Args:
+        func (Callable[[T], R]): The function to run for every item.
+        items (Iterable[T]): The items to process.
+        concurrency (int): The maximum number of items processed at the same time.
+
+    Returns:
+        Iterator[Tuple[int, T, Future]]: Yields the item index, the item and its finished future.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    concurrency = max(1, concurrency)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            iterator = enumerate(items)
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < concurrency * 2:
+                    try:
+                        index, item = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(func, item)] = (index, item)
+
+                if len(pending) == 0:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, item = pending.pop(future)
+                    yield index, item, future
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+@functools.lru_cache(maxsize=1)
+def get_token_encoding():
+    """
+    Returns the tiktoken encoding used for counting tokens.
+
+    Returns:
+        The tiktoken encoding or None if the optional tiktoken package is not installed.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding('o200k_base')
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the number of tokens in the given text.
+
+    The tokens are counted with tiktoken if it is installed, otherwise they are estimated as one token per four
+    characters.
+
+    Args:
+        text (str): The text to count tokens for.
+
+    Returns:
+        int: The number of tokens in the text.
+    """
+    encoding = get_token_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Shortens the text to the whole lines which fit into the given number of tokens.
+
+    Args:
+        text (str): The text to shorten.
+        max_tokens (int): Maximum number of tokens.
+
+    Returns:
+        str: The text if it fits, otherwise its leading lines which fit (empty if not even the first line fits).
+    """
+    encoding = get_token_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        prefix = encoding.decode(tokens[:max_tokens])
+    else:
+        if count_tokens(text) <= max_tokens:
+            return text
+        prefix = text[:max_tokens * 4]
+    return prefix[:prefix.rfind('\n') + 1]
 
 
 def valid_input(value: Optional[str]) -> bool:
@@ -358,6 +878,19 @@ def valid_api_key(value: str) -> bool:
             and len(value.strip()) >= 48)
 
 
+@functools.lru_cache(maxsize=1)
+def load_env_files() -> None:
+    """
+    Loads the environment variables from the ~/.chatgpt-cli/.env file and the .env file in the working directory.
+
+    The files are loaded only once, on the first environment variable lookup.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv(home_env_file)
+    load_dotenv(env_file)
+
+
 def get_env(key: str, default: Optional[str]) -> str:
     """
     Retrieves an environment variable.
@@ -372,6 +905,7 @@ def get_env(key: str, default: Optional[str]) -> str:
     Returns:
         str: The value of the environment variable or the default.
     """
+    load_env_files()
     value = os.getenv(key, default)
     if not valid_input(value):
         value = default
@@ -0,0 +1,96 @@
+from typing import List, Iterable
+
+from cli.core import MessageType, count_tokens
+
+message_overhead_tokens = 4
+
+
+class ChatHistory:
+    """
+    Chat history limited by a token budget.
+
+    Tokens are counted once when a message is added and the count is cached together with the message, so
+    selecting the context for the next question never re-tokenizes old messages. The oldest turns are dropped as
+    soon as the history no longer fits into the budget or exceeds the maximum number of turns.
+    """
+
+    def __init__(self, max_tokens: int, max_turns: int = -1):
+        """
+        Args:
+            max_tokens (int): Maximum number of tokens sent as a context, including the new message (0 - unlimited).
+            max_turns (int, optional): Maximum number of question and answer pairs kept (0 - no history, negative -
+                                       unlimited). Defaults to -1.
+        """
+        self.max_tokens = max_tokens
+        self.max_turns = max_turns
+        self.messages: List[MessageType] = []
+        self.tokens: List[int] = []
+        self.total_tokens = 0
+
+    def append(self, message: MessageType) -> None:
+        """
+        Adds the message to the history and drops the oldest turns that no longer fit.
+
+        Args:
+            message (MessageType): The message to add.
+        """
+        tokens = count_tokens(message['content']) + message_overhead_tokens
+        self.messages.append(message)
+        self.tokens.append(tokens)
+        self.total_tokens += tokens
+        self._trim(self._start_index(0))
+
+    def extend(self, messages: Iterable[MessageType]) -> None:
+        """
+        Adds all messages to the history.
+
+        Args:
+            messages (Iterable[MessageType]): The messages to add.
+        """
+        for message in messages:
+            self.append(message)
+
+    def context(self, message: MessageType) -> List[MessageType]:
+        """
+        Returns the most recent turns that fit into the token budget together with the new message.
+
+        Args:
+            message (MessageType): The new message which is sent after the history.
+
+        Returns:
+            List[MessageType]: The history messages followed by the new message.
+        """
+        reserved = count_tokens(message['content']) + message_overhead_tokens
+        return [*self.messages[self._start_index(reserved):], message]
+
+    def clear(self) -> None:
+        """
+        Removes all messages from the history.
+        """
+        self.messages = []
+        self.tokens = []
+        self.total_tokens = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def _start_index(self, reserved: int) -> int:
+        start = 0
+        total = self.total_tokens
+        if self.max_turns >= 0:
+            while len(self.messages) - start > self.max_turns * 2:
+                total -= self.tokens[start]
+                start += 1
+        if self.max_tokens > 0:
+            while start < len(self.messages) and total + reserved > self.max_tokens:
+                total -= self.tokens[start]
+                start += 1
+        while start < len(self.messages) and self.messages[start]['role'] != 'user':
+            start += 1
+        return start
+
+    def _trim(self, start: int) -> None:
+        if start > 0:
+            self.total_tokens -= sum(self.tokens[:start])
+            del self.messages[:start]
+            del self.tokens[:start]
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import sys
+import uuid
+from typing import List, Optional, Tuple
+
+default_image_preprocess = 'true'
+default_image_cache_dir = os.path.expanduser('~') + '/.chatgpt-cli/images'
+
+# Formats accepted by the image edit endpoint, used unchanged when the image does not have to be downscaled
+accepted_formats = {'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp'}
+read_block_size = 1024 * 1024
+
+
+def prepare_input_images(paths: List[str], image_size: str, image_model: str, cache_dir: str) -> List[str]:
+    """
+    Downscales and re-encodes the input images to the generated image size.
+
+    Every image larger than the target size is resized to fit into it and re-encoded (PNG for dall-e-2 and images
+    with transparency, JPEG otherwise), so edit requests don't upload full-resolution images which the API would
+    downscale anyway. Prepared images are cached by the hash of the original content and the target size, so
+    repeated edits of the same source images are prepared only once. The images are used unchanged if the optional
+    Pillow package is not installed or the image can not be processed.
+
+    Args:
+        paths (List[str]): The paths of the input images.
+        image_size (str): The generated image size (e.g. '1024x1024').
+        image_model (str): The image model used for the edit.
+        cache_dir (str): The directory where prepared images are stored.
+
+    Returns:
+        List[str]: The paths of the images to upload, in the order of the input images.
+    """
+    target_size = parse_image_size(image_size)
+    if target_size is None:
+        return paths
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return paths
+
+    prepared = []
+    for path in paths:
+        try:
+            prepared.append(prepare_image(Image, path, target_size, image_model, cache_dir))
+        except (OSError, ValueError) as e:
+            print(f'Input image {path} is used unchanged: {e}', file=sys.stderr)
+            prepared.append(path)
+    return prepared
+
+
+def prepare_image(image_module, path: str, target_size: Tuple[int, int], image_model: str, cache_dir: str) -> str:
+    """
+    Prepares a single input image, reusing the cached result if it exists.
+
+    Args:
+        image_module: The Pillow Image module.
+        path (str): The path of the input image.
+        target_size (Tuple[int, int]): The maximum width and height of the image.
+        image_model (str): The image model used for the edit.
+        cache_dir (str): The directory where prepared images are stored.
+
+    Returns:
+        str: The path of the image to upload.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(read_block_size), b''):
+            digest.update(block)
+    digest.update(f'{target_size[0]}x{target_size[1]}:{image_model == "dall-e-2"}'.encode('utf-8'))
+    key = digest.hexdigest()
+
+    for extension in ['.png', '.jpg']:
+        cached_path = os.path.join(cache_dir, key + extension)
+        if os.path.exists(cached_path):
+            return cached_path
+
+    with image_module.open(path) as image:
+        if image.width <= target_size[0] and image.height <= target_size[1] and image.format in accepted_formats and \
+                (image_model != 'dall-e-2' or image.format == 'PNG'):
+            return path
+
+        image.thumbnail(target_size, image_module.LANCZOS)
+        transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        if image_model == 'dall-e-2' or transparent:
+            extension, image_format, options = '.png', 'PNG', {'optimize': True}
+            if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGBA')
+        else:
+            extension, image_format, options = '.jpg', 'JPEG', {'quality': 90}
+            image = image.convert('RGB')
+
+        os.makedirs(cache_dir, exist_ok=True)
+        cached_path = os.path.join(cache_dir, key + extension)
+        tmp_path = f'{cached_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            image.save(tmp_path, image_format, **options)
+            os.replace(tmp_path, cached_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return cached_path
+
+
+def parse_image_size(image_size: str) -> Optional[Tuple[int, int]]:
+    """
+    Parses the image size in the "<width>x<height>" format.
+
+    Args:
+        image_size (str): The image size.
+
+    Returns:
+        Optional[Tuple[int, int]]: The width and height or None if the size has a different format (e.g. 'auto').
+    """
+    try:
+        width, height = image_size.lower().split('x')
+        return int(width), int(height)
+    except ValueError:
+        return None
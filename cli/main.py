@@ -1,20 +1,16 @@
 import os
 import sys
 import time
-import re
-from datetime import datetime
-
-import openai
-from colorama import Fore
-from colorama import Style
-from colorama import init as colorama_init
-from prompt_toolkit import prompt
-from prompt_toolkit.styles import Style as PromptStyle
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from cli import __version__
-from cli.core import ensure_api_key, icase_contains, chatgpt_response, check_args_for_key, get_env
+from cli.core import ensure_api_key, icase_contains, chatgpt_response, check_args_for_key, get_env, default_model, \
+    get_metrics_recorder
+from cli.history import ChatHistory
+from cli.render import StreamRenderer
+from cli.session import SessionStore, default_session_store
+from cli.transcript import Transcript
 
 
 def main():
@@ -31,18 +27,37 @@ def main():
 
     Behaviors:
     - If the output file already exists, users will be prompted to continue, start anew, or delete content.
-    - Conversation history is maintained up to a specified limit set by the 'HISTORY_SIZE' environment variable.
+    - Conversation history is limited to the token budget set by the 'HISTORY_TOKENS' environment variable and to
+      the number of last message pairs set by the 'HISTORY_SIZE' environment variable.
+    - With 'CHAT_SERVER_HISTORY' enabled, only the new question is sent and the conversation is continued from
+      the previous response stored by the API, falling back to the local history after reset or on errors.
+    - With 'CHAT_SESSION_STORE' enabled, every turn is also recorded in a structured session store, which can be
+      listed, searched and resumed using the "/sessions", "/search" and "/resume" commands.
     - User input can be colored based on the environment configuration.
     """
 
     key_in_args, file_out = check_args_for_key()
 
-    openai.api_key = ensure_api_key(prompt=True, use_args_key=key_in_args)
+    ensure_api_key(prompt=True, use_args_key=key_in_args)
+
+    from colorama import Fore
+    from colorama import Style
+    from colorama import init as colorama_init
+    from prompt_toolkit import prompt
+    from prompt_toolkit.styles import Style as PromptStyle
 
     history_size = int(get_env('HISTORY_SIZE', '3'))
 
+    history_tokens = int(get_env('HISTORY_TOKENS', '4000'))
+
+    server_history = icase_contains(get_env('CHAT_SERVER_HISTORY', 'false'), ['true', 'yes', 'on'])
+
     text_width = int(get_env('CHAT_TEXT_WIDTH', '0'))
 
+    typing_delay = float(get_env('CHAT_TYPING_DELAY', '0'))
+
+    session_store_path = get_env('CHAT_SESSION_STORE', 'false')
+
     colored = icase_contains(get_env('CHAT_COLORED', 'true'), ['true', 'yes', 'on'])
     color_you = get_env('CHAT_COLOR_YOU', 'green').upper()
     color_ai = get_env('CHAT_COLOR_AI', 'white').upper()
@@ -60,7 +75,17 @@ def main():
     print(f'Welcome to the ChatGPT command-line interface v{__version__}\n')
     print('Please enter your question (type "/quit" to stop chatting, type "/reset" to clear chat history)\n')
 
-    file = None
+    session_store = None
+    session_id = None
+    if not icase_contains(session_store_path, ['false', 'no', 'off']):
+        if icase_contains(session_store_path, ['true', 'yes', 'on']):
+            session_store_path = default_session_store
+        session_store = SessionStore(os.path.expanduser(session_store_path))
+        session_id = session_store.start_session(os.path.abspath(file_out) if file_out else None)
+        print(f'Session {session_id} is recorded (type "/sessions" to list sessions, "/search <text>" to search '
+              f'messages, "/resume <id>" to continue a session)\n')
+
+    transcript = None
     file_messages = []
     if file_out:
         file_dir = os.path.dirname(file_out)
@@ -88,47 +113,41 @@ def main():
                 except ValueError:
                     print('Invalid option selected. Available options: 1, 2, or 3\n')
 
-        file = open(file_out, 'w' if option == 3 else 'a')
-        now = datetime.now()
-        prefix = '\n\n' if os.path.getsize(file_out) > 0 else ''
-        file.write(f'{prefix}[{now.isoformat()}]\n')
-        file.flush()
-
-        if option == 1:
-            date_pattern = re.compile("^\[\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{6}]$")
-            with open(file_out, 'r') as fp:
-                role = None
-                content = ''
-                for line in fp:
-                    line_text = line if not date_pattern.match(line) else ''
-                    new_role = None
-                    if line.startswith('AI: '):
-                        new_role = 'assistant'
-                        line_text = line.replace('AI: ', '', 1)
-                    if line.startswith('You: '):
-                        new_role = 'user'
-                        line_text = line.replace('You: ', '', 1)
-                    if role is None:
-                        role = new_role
-
-                    if role is not None:
-                        content += line_text
-
-                    if role != new_role and role is not None:
-                        if not icase_contains(content.replace('\n', ''),
-                                              ['/quit', '/q', '/reset', '/r', 'goodbye']) and \
-                                content.replace('\n', '') != 'Let\'s start a new conversation.':
-                            file_messages.append({'role': role, 'content': content})
-                        role = new_role
-                        content = ''
-
-                    if icase_contains(line_text.replace('\n', ''), ['/reset', '/r']):
-                        file_messages.clear()
-
-    chat_history = [*file_messages[-2 * (history_size + 1):]]
+        transcript = Transcript(file_out, truncate=option == 3)
+        transcript.write_header()
+
+        if option == 1 and history_size > 0:
+            file_messages = transcript.last_messages(max_messages=history_size * 2, max_tokens=history_tokens)
+
+    renderer = StreamRenderer(width=text_width, color=color_ai_ansi, color_end=color_end, typing_delay=typing_delay)
+
+    chat_history = ChatHistory(history_tokens, history_size)
+    chat_history.extend(file_messages)
+
+    model = get_env('GPT_MODEL', default_model)
+
+    last_response = {'id': None, 'usage': None}
+
+    def on_response(completed_response):
+        last_response['id'] = completed_response.id
+        last_response['usage'] = completed_response.usage
+
+    def record_answer(content: str, started: float):
+        chat_history.append({'role': 'assistant', 'content': content})
+        if transcript:
+            transcript.write_message('assistant', content)
+        if session_store:
+            usage = last_response['usage']
+            session_store.add_turn(
+                session_id, 'assistant', content, model=model, latency=time.perf_counter() - started,
+                input_tokens=usage.input_tokens if usage else None,
+                output_tokens=usage.output_tokens if usage else None,
+                cached_tokens=usage.input_tokens_details.cached_tokens if usage else None)
+
     while True:
-        stream_content = ''
+        stream_deltas = []
         stream_in_progress = False
+        request_started = time.perf_counter()
         try:
             try:
                 style = PromptStyle.from_dict(
@@ -139,9 +158,33 @@ def main():
                 if colored:
                     print('', end=color_end)
 
-            if file:
-                file.write(f'\nYou: {question}\n')
-                file.flush()
+            if session_store and question and question.strip().split(' ', 1)[0].lower() in \
+                    ['/sessions', '/search', '/resume']:
+                command, _, argument = question.strip().partition(' ')
+                command = command.lower()
+                argument = argument.strip()
+                print('')
+                if command == '/sessions':
+                    for listed_id, started_at, count, first_question in session_store.list_sessions():
+                        preview = (first_question or '').replace('\n', ' ')[:60]
+                        print(f'{listed_id}. [{started_at[:19]}] {count} messages: {preview}')
+                elif command == '/search':
+                    for found_id, created_at, role, snippet in session_store.search(argument):
+                        print(f'{found_id}. [{created_at[:19]}] {role}: {snippet.replace(chr(10), " ")[:120]}')
+                elif argument.isdigit() and session_store.session_exists(int(argument)):
+                    session_id = int(argument)
+                    chat_history.clear()
+                    if history_size > 0:
+                        chat_history.extend(session_store.last_messages(session_id, history_size * 2, history_tokens))
+                    last_response['id'] = None
+                    print(f'Resumed session {session_id} with {len(chat_history)} messages in history')
+                else:
+                    print(f'Session "{argument}" does not exist')
+                print('')
+                continue
+
+            if transcript:
+                transcript.write_message('user', question)
 
             if question is None or question.strip() == '':
                 continue
@@ -150,69 +193,69 @@ def main():
                 break
 
             if icase_contains(question, ['/reset', '/r']):
-                chat_history = []
+                chat_history.clear()
+                last_response['id'] = None
+                if session_store:
+                    session_store.add_turn(session_id, 'reset', '')
                 print(f'\n{color_ai_ansi}AI: Let\'s start a new conversation.\n\n', end=color_end)
-                if file:
-                    file.write(f'\nAI: Let\'s start a new conversation.\n\n')
-                    file.flush()
+                if transcript:
+                    transcript.write_message('assistant', 'Let\'s start a new conversation.')
                 continue
 
             message = {'role': 'user', 'content': question}
-            messages = [
-                *chat_history,
-                message
-            ]
+            previous_response_id = last_response['id'] if server_history else None
+            last_response['id'] = None
+            last_response['usage'] = None
+
+            if session_store:
+                session_store.add_turn(session_id, 'user', question)
 
-            response = chatgpt_response(messages)
+            response = None
+            if previous_response_id:
+                response = chatgpt_response([message], previous_response_id=previous_response_id,
+                                            on_response=on_response)
+            if response is None:
+                response = chatgpt_response(chat_history.context(message), on_response=on_response)
             if response is None:
                 break
 
-            if file and isinstance(response, str):
-                file.write(f'\nAI: {response}\n')
-                file.flush()
-
             chat_history.append(message)
 
             if isinstance(response, str):
-                chat_history.append({'role': 'assistant', 'content': response})
+                record_answer(response, request_started)
             else:
                 stream_in_progress = True
 
             print(f'\n{color_ai_ansi}AI: ', end=color_end)
-            count = 0
-            for token in response:
-                for char in token:
-                    count += 1
-                    stream_content += char
-                    print(f'{color_ai_ansi}{char}', end=color_end, flush=True)
-                    if 0 < text_width <= count:
-                        print('')
-                        count = 0
-                    time.sleep(0.01)
+            renderer.reset()
+            if isinstance(response, str):
+                renderer.write(response)
+            else:
+                for token in response:
+                    stream_deltas.append(token)
+                    renderer.write(token)
             print('\n')
             stream_in_progress = False
 
             if not isinstance(response, str):
-                chat_history.append({'role': 'assistant', 'content': stream_content})
-                if file:
-                    file.write(f'\nAI: {stream_content}\n')
-                    file.flush()
-
-            if len(chat_history) >= (history_size + 1) * 2:
-                chat_history = chat_history[2:]
+                record_answer(''.join(stream_deltas), request_started)
         except KeyboardInterrupt:
             if stream_in_progress:
-                chat_history.append({'role': 'assistant', 'content': stream_content})
-                if file:
-                    file.write(f'\nAI: {stream_content}\n')
-                    file.flush()
+                record_answer(''.join(stream_deltas), request_started)
                 print('\n')
             else:
                 break
     print(f'\n{color_ai_ansi}AI: Goodbye', end=color_end)
-    if file:
-        file.write(f'\nAI: Goodbye\n')
-        file.close()
+    if transcript:
+        transcript.write_message('assistant', 'Goodbye')
+        transcript.close()
+    if session_store:
+        session_store.close()
+
+    recorder = get_metrics_recorder()
+    summary = recorder.summary() if recorder else None
+    if summary:
+        print(f'\n\n{summary}', file=sys.stderr)
 
 
 if __name__ == '__main__':
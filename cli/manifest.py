@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+from typing import Dict, List
+
+default_refactor_manifest = '.chatgpt-cli-refactor.json'
+
+read_block_size = 1024 * 1024
+
+
+class RefactorManifest:
+    """
+    Record of files which were already refactored, stored as a JSON file in the working directory.
+
+    For every file path and refactoring job (the hash of the prompt and the model parameters) the manifest stores the
+    hash of the file content before the refactoring and the hash of the content written after it. A file is done for
+    the job if its current content is either its own recorded input or output, so files which were not changed since
+    the last run are not sent again, while other files with the same content are still refactored.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The path of the manifest file.
+        """
+        self.path = path
+        self.files: Dict[str, Dict[str, List[str]]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.files = json.load(f).get('files', {})
+            except (OSError, ValueError, AttributeError):
+                self.files = {}
+
+    def is_done(self, job: str, file_path: str, content_hash: str) -> bool:
+        """
+        Checks if the file was already refactored by the job and was not changed since.
+
+        Args:
+            job (str): The refactoring job key.
+            file_path (str): The path of the file.
+            content_hash (str): The hash of the current file content.
+
+        Returns:
+            bool: True if the content is the recorded input or output of the file for the job, otherwise False.
+        """
+        return content_hash in self.files.get(os.path.normpath(file_path), {}).get(job, [])
+
+    def record(self, job: str, file_path: str, before_hash: str, after_hash: str) -> None:
+        """
+        Records the refactored file and saves the manifest.
+
+        Args:
+            job (str): The refactoring job key.
+            file_path (str): The path of the file.
+            before_hash (str): The hash of the file content before the refactoring.
+            after_hash (str): The hash of the file content after the refactoring.
+        """
+        self.files.setdefault(os.path.normpath(file_path), {})[job] = [before_hash, after_hash]
+        self.save()
+
+    def save(self) -> None:
+        """
+        Atomically saves the manifest.
+        """
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files}, f)
+        os.replace(tmp_path, self.path)
+
+
+def file_hash(file_path: str) -> str:
+    """
+    Computes the hash of the file content.
+
+    Args:
+        file_path (str): The path of the file.
+
+    Returns:
+        str: The hex encoded SHA-256 digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(read_block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
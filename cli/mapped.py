@@ -0,0 +1,66 @@
+import codecs
+import hashlib
+import mmap
+import os
+
+
+class MappedInput:
+    """
+    Read-only memory map of a seekable input file, read as a text stream.
+
+    The file content is never copied into a Python bytes object: the size is known without reading, the digest is
+    computed directly over the mapped pages, and the text is decoded incrementally in the blocks that are read, so
+    consumers which process the input in chunks keep only the current chunk in memory.
+    """
+
+    def __init__(self, fileno: int, encoding: str = 'utf-8'):
+        """
+        Args:
+            fileno (int): The file descriptor of the input file, mapped from its current position.
+            encoding (str, optional): The text encoding of the input. Defaults to 'utf-8'.
+
+        Raises:
+            OSError: If the file can not be memory mapped.
+            ValueError: If the file is empty.
+        """
+        offset = os.lseek(fileno, 0, os.SEEK_CUR)
+        self.buffer = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.buffer)[offset:]
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.position = 0
+
+    def read(self, size: int = -1) -> str:
+        """
+        Decodes the next part of the input.
+
+        Args:
+            size (int, optional): Number of bytes to decode (negative - the rest of the input). Defaults to -1.
+
+        Returns:
+            str: The decoded text, empty only at the end of the input.
+        """
+        text = ''
+        while text == '' and self.position < len(self.view):
+            end = len(self.view) if size < 0 else min(len(self.view), self.position + max(size, 4))
+            text = self.decoder.decode(self.view[self.position:end], final=end == len(self.view))
+            self.position = end
+        return text
+
+    def digest(self) -> str:
+        """
+        Computes the digest of the whole input without decoding it.
+
+        Returns:
+            str: The hex encoded SHA-256 digest of the input bytes.
+        """
+        return hashlib.sha256(self.view).hexdigest()
+
+    def close(self) -> None:
+        """
+        Releases the memory map.
+        """
+        self.view.release()
+        self.buffer.close()
+
+    def __len__(self) -> int:
+        return len(self.view)
@@ -0,0 +1,314 @@
+import datetime
+import json
+import math
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+default_metrics = ''
+default_metrics_summary = 'false'
+
+# The request being sent by the current thread, whose connection events are traced by the HTTP client hook
+current = threading.local()
+
+
+class RequestMetrics:
+    """
+    Measurements of a single API request, emitted as one record when the request finishes.
+
+    The connect time is the time spent opening new connections (0 when a pooled connection was reused), the time to
+    first token is measured from the start of the request to the first streamed text delta (or to the complete
+    response when not streaming), and the throughput is the number of output tokens per second after the first
+    token (over the whole latency when not streaming).
+    """
+
+    def __init__(self, recorder: 'MetricsRecorder', endpoint: str, model: str):
+        """
+        Args:
+            recorder (MetricsRecorder): The recorder which receives the finished record.
+            endpoint (str): The endpoint name (e.g. 'responses').
+            model (str): The requested model.
+        """
+        self.recorder = recorder
+        self.endpoint = endpoint
+        self.model = model
+        self.started = time.perf_counter()
+        self.connect_started: Optional[float] = None
+        self.connect_time = 0.0
+        self.first_token_time: Optional[float] = None
+        self.retries = 0
+        self.streamed = False
+        self.usage: Dict[str, Optional[int]] = {'input_tokens': None, 'output_tokens': None, 'cached_tokens': None}
+        self.finished = False
+        current.metrics = self
+
+    def trace(self, event_name: str, info: dict) -> None:
+        """
+        Connection trace callback of the HTTP transport, which accumulates the time spent connecting.
+
+        Args:
+            event_name (str): The trace event name (e.g. 'connection.connect_tcp.started').
+            info (dict): The event details.
+        """
+        if event_name == 'connection.connect_tcp.started':
+            self.connect_started = time.perf_counter()
+        elif event_name in ['connection.connect_tcp.complete', 'connection.start_tls.complete'] and \
+                self.connect_started is not None:
+            now = time.perf_counter()
+            self.connect_time += now - self.connect_started
+            self.connect_started = now
+
+    def retry(self) -> None:
+        """
+        Counts a retried attempt of the request.
+        """
+        self.retries += 1
+
+    def response_received(self, streamed: bool) -> None:
+        """
+        Marks the response as received, which ends the tracing of its connection.
+
+        Args:
+            streamed (bool): Whether the response body is streamed, otherwise the complete response was received.
+        """
+        if getattr(current, 'metrics', None) is self:
+            current.metrics = None
+        self.streamed = streamed
+        if not streamed:
+            self.first_token()
+
+    def first_token(self) -> None:
+        """
+        Marks the time of the first received token.
+        """
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+
+    def set_usage(self, usage: Any) -> None:
+        """
+        Reads the token counts from the usage of the API response.
+
+        Args:
+            usage (Any): The usage object of the response, or None if the response has no usage.
+        """
+        if usage is None:
+            return
+        details = getattr(usage, 'input_tokens_details', None)
+        self.usage = {'input_tokens': getattr(usage, 'input_tokens', None),
+                      'output_tokens': getattr(usage, 'output_tokens', None),
+                      'cached_tokens': getattr(details, 'cached_tokens', None)}
+
+    def finish(self, status: str = 'ok', error: Optional[Exception] = None) -> None:
+        """
+        Completes the measurements and emits the record. Only the first call has an effect.
+
+        Args:
+            status (str, optional): The request status ('ok', 'cached', 'incomplete' or 'error'). Defaults to 'ok'.
+            error (Optional[Exception], optional): The error the request failed with. Defaults to None.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        if getattr(current, 'metrics', None) is self:
+            current.metrics = None
+
+        now = time.perf_counter()
+        output_tokens = self.usage['output_tokens']
+        tokens_per_second = None
+        if output_tokens and self.first_token_time is not None:
+            # Non-streamed responses arrive at once, so their generation time is the whole latency
+            generation_time = now - (self.first_token_time if self.streamed else self.started)
+            tokens_per_second = round(output_tokens / generation_time, 1) if generation_time > 0 else None
+
+        record = {
+            'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'command': os.path.basename(sys.argv[0]),
+            'endpoint': self.endpoint,
+            'model': self.model,
+            'status': 'error' if error is not None else status,
+            'latency_ms': round((now - self.started) * 1000, 1),
+            'connect_ms': round(self.connect_time * 1000, 1),
+            'ttft_ms': round((self.first_token_time - self.started) * 1000, 1)
+            if self.first_token_time is not None else None,
+            'tokens_per_second': tokens_per_second,
+            **self.usage,
+            'retries': self.retries
+        }
+        if error is not None:
+            record['error'] = f'{type(error).__name__}: {error}'
+        self.recorder.emit(record)
+
+
+class MetricsRecorder:
+    """
+    Collects the records of all requests of the process and writes them as JSON lines to stderr or a file.
+    """
+
+    def __init__(self, target: str, summary: bool = False):
+        """
+        Args:
+            target (str): Where the records are written ('stderr', a file path, or '' - not written).
+            summary (bool, optional): Whether the records are kept for the session summary. Defaults to False.
+        """
+        self.target = target
+        self.summary_enabled = summary
+        self.records: List[dict] = []
+        self.lock = threading.Lock()
+
+    def start(self, endpoint: str, model: str) -> RequestMetrics:
+        """
+        Starts measuring a request sent by the current thread.
+
+        Args:
+            endpoint (str): The endpoint name (e.g. 'responses').
+            model (str): The requested model.
+
+        Returns:
+            RequestMetrics: The measurements of the request.
+        """
+        return RequestMetrics(self, endpoint, model)
+
+    def emit(self, record: dict) -> None:
+        """
+        Writes the record as a JSON line and keeps it for the summary.
+
+        Args:
+            record (dict): The finished request record.
+        """
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            if self.summary_enabled:
+                self.records.append(record)
+            if self.target == 'stderr':
+                sys.stderr.write(line)
+                sys.stderr.flush()
+            elif self.target != '':
+                try:
+                    with open(os.path.expanduser(self.target), 'a', encoding='utf-8') as f:
+                        f.write(line)
+                except OSError as e:
+                    print(f'Failed to write metrics: {e}', file=sys.stderr)
+
+    def summary(self) -> Optional[str]:
+        """
+        Summarizes the recorded requests.
+
+        Returns:
+            Optional[str]: The summary or None if summaries are disabled or no request was recorded.
+        """
+        with self.lock:
+            records = list(self.records)
+        if not self.summary_enabled or len(records) == 0:
+            return None
+
+        sent = [record for record in records if record['status'] != 'cached']
+        failed = [record for record in sent if record['status'] == 'error']
+        lines = [f'Requests: {len(records)} ({len(records) - len(sent)} cached, {len(failed)} failed), '
+                 f'{sum(record["retries"] for record in records)} retries']
+
+        latencies = [record['latency_ms'] for record in sent if record['status'] != 'error']
+        if len(latencies) > 0:
+            lines.append(f'Latency: avg {average(latencies):.0f} ms, p50 {percentile(latencies, 50):.0f} ms, '
+                         f'p95 {percentile(latencies, 95):.0f} ms')
+        ttfts = [record['ttft_ms'] for record in sent if record['ttft_ms'] is not None]
+        if len(ttfts) > 0:
+            lines.append(f'Time to first token: avg {average(ttfts):.0f} ms, p50 {percentile(ttfts, 50):.0f} ms, '
+                         f'p95 {percentile(ttfts, 95):.0f} ms')
+        throughputs = [record['tokens_per_second'] for record in sent if record['tokens_per_second'] is not None]
+        if len(throughputs) > 0:
+            lines.append(f'Throughput: avg {average(throughputs):.1f} tokens/s')
+
+        input_tokens = sum(record['input_tokens'] or 0 for record in sent)
+        output_tokens = sum(record['output_tokens'] or 0 for record in sent)
+        cached_tokens = sum(record['cached_tokens'] or 0 for record in sent)
+        if input_tokens > 0 or output_tokens > 0:
+            lines.append(f'Tokens: {input_tokens} input ({cached_tokens} cached, '
+                         f'{cached_tokens / input_tokens * 100 if input_tokens > 0 else 0:.0f}%), '
+                         f'{output_tokens} output')
+        return '\n'.join(lines)
+
+
+class UsageTotals:
+    """
+    Token usage of all responses received by the process, shared by all threads.
+    """
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.lock = threading.Lock()
+
+    def add(self, usage: Any) -> None:
+        """
+        Adds the token counts of the response usage.
+
+        Args:
+            usage (Any): The usage object of the response, or None if the response has no usage.
+        """
+        if usage is None:
+            return
+        details = getattr(usage, 'input_tokens_details', None)
+        with self.lock:
+            self.input_tokens += getattr(usage, 'input_tokens', None) or 0
+            self.cached_tokens += getattr(details, 'cached_tokens', None) or 0
+            self.output_tokens += getattr(usage, 'output_tokens', None) or 0
+
+    def summary(self) -> Optional[str]:
+        """
+        Summarizes the token usage, including the share of input tokens read from the prompt cache.
+
+        Returns:
+            Optional[str]: The summary or None if no usage was recorded.
+        """
+        with self.lock:
+            if self.input_tokens == 0:
+                return None
+            return f'Used {self.input_tokens} input tokens ({self.cached_tokens} cached, ' \
+                   f'{self.cached_tokens / self.input_tokens * 100:.0f}%) and {self.output_tokens} output tokens.'
+
+
+usage_totals = UsageTotals()
+
+
+def trace_request(request) -> None:
+    """
+    HTTP client event hook which traces the connection of the request sent by the current thread.
+
+    Args:
+        request (httpx.Request): The request about to be sent.
+    """
+    metrics = getattr(current, 'metrics', None)
+    if metrics is not None:
+        request.extensions['trace'] = metrics.trace
+
+
+def average(values: List[float]) -> float:
+    """
+    Returns the arithmetic mean of the values.
+
+    Args:
+        values (List[float]): The values, at least one.
+
+    Returns:
+        float: The mean.
+    """
+    return sum(values) / len(values)
+
+
+def percentile(values: List[float], rank: float) -> float:
+    """
+    Returns the nearest-rank percentile of the values.
+
+    Args:
+        values (List[float]): The values, at least one.
+        rank (float): The percentile rank (0 - 100).
+
+    Returns:
+        float: The value at the percentile.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(rank / 100 * len(ordered)) - 1))
+    return ordered[index]
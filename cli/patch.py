@@ -0,0 +1,101 @@
+import re
+from typing import List, Tuple
+
+search_marker = re.compile(r'^<{5,9} ?SEARCH\s*$')
+divider_marker = re.compile(r'^={5,9}\s*$')
+replace_marker = re.compile(r'^>{5,9} ?REPLACE\s*$')
+
+edit_blocks_instruction = """Return only the changes to the file as search/replace blocks in this format:
+<<<<<<< SEARCH
+exact lines from the current file
+=======
+lines which replace them
+>>>>>>> REPLACE
+Every search part must match the current file exactly, including whitespace, and must be unique in the file, so \
+include enough surrounding lines. Use as many blocks as needed, in the order of the file. If no changes are needed, \
+return an empty response."""
+
+EditBlockType = Tuple[str, str]
+
+
+class PatchError(ValueError):
+    """
+    Raised when the edit blocks can not be parsed or applied to the file content.
+    """
+
+
+def parse_edit_blocks(text: str) -> List[EditBlockType]:
+    """
+    Parses the search/replace edit blocks from the response text.
+
+    Any text outside the blocks (e.g. explanations or markdown code fences) is ignored.
+
+    Args:
+        text (str): The response text.
+
+    Returns:
+        List[EditBlockType]: Tuples of the searched and the replacement text, in the order of the response.
+
+    Raises:
+        PatchError: If a block is not terminated.
+    """
+    blocks = []
+    lines = text.splitlines()
+    index = 0
+    while index < len(lines):
+        if not search_marker.match(lines[index]):
+            index += 1
+            continue
+
+        search, replace = [], []
+        index += 1
+        while index < len(lines) and not divider_marker.match(lines[index]):
+            search.append(lines[index])
+            index += 1
+        index += 1
+        while index < len(lines) and not replace_marker.match(lines[index]):
+            replace.append(lines[index])
+            index += 1
+        if index >= len(lines):
+            raise PatchError('Edit block is not terminated')
+        index += 1
+
+        blocks.append(('\n'.join(search), '\n'.join(replace)))
+    return blocks
+
+
+def apply_edit_blocks(content: str, blocks: List[EditBlockType]) -> str:
+    """
+    Applies the edit blocks to the content.
+
+    Blocks are applied one after another, and every searched text must occur exactly once in the content at the
+    time its block is applied, so an ambiguous or outdated edit is never applied to the wrong place.
+
+    Args:
+        content (str): The current file content.
+        blocks (List[EditBlockType]): The edit blocks to apply.
+
+    Returns:
+        str: The edited content.
+
+    Raises:
+        PatchError: If a searched text is not found or is not unique.
+    """
+    for search, replace in blocks:
+        if search == '':
+            if content.strip() != '':
+                raise PatchError('Edit block with an empty search part can only be applied to an empty file')
+            content = replace + '\n'
+            continue
+
+        if replace == '' and content.count(search) == 1 and content.count(search + '\n') == 1:
+            # Remove the deleted lines completely instead of leaving an empty line in their place
+            search = search + '\n'
+
+        occurrences = content.count(search)
+        if occurrences == 0:
+            raise PatchError(f'Searched lines not found in the file: {search.splitlines()[0]!r}')
+        if occurrences > 1:
+            raise PatchError(f'Searched lines found {occurrences} times in the file: {search.splitlines()[0]!r}')
+        content = content.replace(search, replace, 1)
+    return content
@@ -0,0 +1,257 @@
+import random
+import re
+import sys
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional, Tuple, TypeVar, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from cli.metrics import RequestMetrics
+
+T = TypeVar('T')
+
+default_max_retries = '5'
+retry_base_delay = 1.0
+retry_max_delay = 60.0
+
+duration_pattern = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+duration_units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+retried_status_codes = [408, 409, 429, 500, 502, 503, 504]
+
+
+class TokenBucket:
+    """
+    Token bucket which refills its full capacity evenly over a minute.
+    """
+
+    def __init__(self, capacity: float):
+        """
+        Args:
+            capacity (float): The number of units available per minute.
+        """
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """
+        Adds the units refilled since the last update.
+
+        Args:
+            now (float): The current monotonic time.
+        """
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Returns the number of seconds until the amount is available. Amounts larger than the capacity are available
+        when the bucket is full.
+
+        Args:
+            amount (float): The amount to take.
+
+        Returns:
+            float: The number of seconds to wait (0 - available now).
+        """
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity) if self.capacity > 0 else 0.0
+
+
+class RateLimiter:
+    """
+    Client-side limiter of requests and tokens per minute, shared by all threads of the process.
+
+    The limits and the remaining capacity are learned from the rate limit headers of every API response (the
+    'x-ratelimit-*' headers), separately for every endpoint, so requests are delayed locally before the account limit
+    is reached instead of failing with 429 responses. Until the first response is received, requests are not
+    delayed. A rate limited request pauses all requests to the same endpoint for the time the server asks for.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.paused_until: Dict[str, float] = {}
+
+    def acquire(self, endpoint: str, tokens: int = 0) -> None:
+        """
+        Blocks until a request with the given number of tokens can be sent to the endpoint, and takes the capacity.
+
+        Args:
+            endpoint (str): The endpoint name (e.g. 'responses').
+            tokens (int, optional): The estimated number of tokens of the request. Defaults to 0.
+        """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                wait = self.paused_until.get(endpoint, 0) - now
+                for kind, amount in [('requests', 1), ('tokens', tokens)]:
+                    bucket = self.buckets.get((endpoint, kind))
+                    if bucket is not None:
+                        bucket.refill(now)
+                        wait = max(wait, bucket.wait_time(amount))
+                if wait <= 0:
+                    break
+                self.condition.wait(wait)
+
+            for kind, amount in [('requests', 1), ('tokens', tokens)]:
+                bucket = self.buckets.get((endpoint, kind))
+                if bucket is not None:
+                    bucket.level -= amount
+
+    def update(self, endpoint: str, headers: Mapping[str, str]) -> None:
+        """
+        Updates the limits and the remaining capacity from the rate limit response headers.
+
+        Args:
+            endpoint (str): The endpoint name (e.g. 'responses').
+            headers (Mapping[str, str]): The response headers.
+        """
+        with self.condition:
+            now = time.monotonic()
+            for kind in ['requests', 'tokens']:
+                try:
+                    limit = float(headers[f'x-ratelimit-limit-{kind}'])
+                    remaining = float(headers[f'x-ratelimit-remaining-{kind}'])
+                except (KeyError, ValueError):
+                    continue
+                bucket = self.buckets.get((endpoint, kind))
+                if bucket is None or bucket.capacity != limit:
+                    bucket = self.buckets[(endpoint, kind)] = TokenBucket(limit)
+                bucket.refill(now)
+                bucket.level = min(bucket.level, remaining)
+            self.condition.notify_all()
+
+    def pause(self, endpoint: str, seconds: float) -> None:
+        """
+        Delays all requests to the endpoint for the given number of seconds.
+
+        Args:
+            endpoint (str): The endpoint name (e.g. 'responses').
+            seconds (float): The number of seconds to pause.
+        """
+        with self.condition:
+            self.paused_until[endpoint] = max(self.paused_until.get(endpoint, 0), time.monotonic() + seconds)
+
+    def on_response(self, response) -> None:
+        """
+        HTTP client event hook which updates the limiter from every API response.
+
+        Args:
+            response (httpx.Response): The received response.
+        """
+        self.update(endpoint_name(response.request.url.path), response.headers)
+
+
+rate_limiter = RateLimiter()
+
+
+def retry_request(func: Callable[[], T], endpoint: str, tokens: int = 0, max_retries: int = 5,
+                  metrics: Optional['RequestMetrics'] = None) -> T:
+    """
+    Sends the request through the rate limiter, retrying it with jittered exponential backoff on transient errors.
+
+    Rate limit errors, timeouts, connection errors and server errors are retried. The delay is the one requested by
+    the server in the 'Retry-After' header if present, otherwise it grows exponentially with random jitter, so
+    concurrent workers don't retry at the same time. Rate limit errors caused by an exhausted quota are not retried.
+
+    Args:
+        func (Callable[[], T]): Sends the request and returns its result.
+        endpoint (str): The endpoint name (e.g. 'responses').
+        tokens (int, optional): The estimated number of tokens of the request. Defaults to 0.
+        max_retries (int, optional): Maximum number of retries. Defaults to 5.
+        metrics (Optional[RequestMetrics], optional): The measurements of the request, which count the retries and
+                                                      record the final error. Defaults to None.
+
+    Returns:
+        T: The result of the request.
+
+    Raises:
+        openai.APIError: If the request fails with a non-retryable error or all retries fail.
+    """
+    from openai import APIConnectionError, APIStatusError, RateLimitError
+
+    attempt = 0
+    while True:
+        rate_limiter.acquire(endpoint, tokens)
+        try:
+            return func()
+        except (APIConnectionError, APIStatusError) as e:
+            status_code = getattr(e, 'status_code', None)
+            retryable = isinstance(e, APIConnectionError) or status_code in retried_status_codes
+            if isinstance(e, RateLimitError) and getattr(e, 'code', None) == 'insufficient_quota':
+                retryable = False
+            if not retryable or attempt >= max_retries:
+                if metrics:
+                    metrics.finish(error=e)
+                raise
+
+            delay = retry_after(e.response.headers) if isinstance(e, APIStatusError) else None
+            if delay is None:
+                delay = random.uniform(0, min(retry_max_delay, retry_base_delay * 2 ** attempt))
+            if isinstance(e, RateLimitError):
+                rate_limiter.pause(endpoint, delay)
+            attempt += 1
+            if metrics:
+                metrics.retry()
+            print(f'Request failed ({status_code or "connection error"}), retrying in {delay:.1f}s '
+                  f'(attempt {attempt} of {max_retries})...', file=sys.stderr)
+            time.sleep(delay)
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Reads the retry delay requested by the server.
+
+    Args:
+        headers (Mapping[str, str]): The response headers.
+
+    Returns:
+        Optional[float]: The number of seconds to wait or None if the server did not specify it.
+    """
+    try:
+        if 'retry-after-ms' in headers:
+            return float(headers['retry-after-ms']) / 1000
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    for kind in ['requests', 'tokens']:
+        reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}', ''))
+        if reset is not None and headers.get(f'x-ratelimit-remaining-{kind}') == '0':
+            return reset
+    return None
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Parses the duration in the format of the rate limit reset headers (e.g. '1s', '6m0s' or '20ms').
+
+    Args:
+        value (str): The duration.
+
+    Returns:
+        Optional[float]: The number of seconds or None if the value is not a duration.
+    """
+    parts = duration_pattern.findall(value)
+    if len(parts) == 0:
+        return None
+    return sum(float(amount) * duration_units[unit] for amount, unit in parts)
+
+
+def endpoint_name(path: str) -> str:
+    """
+    Returns the endpoint name used as the rate limiter key for the request path.
+
+    Args:
+        path (str): The request URL path (e.g. '/v1/images/generations').
+
+    Returns:
+        str: The endpoint name (e.g. 'images').
+    """
+    if '/images/' in path:
+        return 'images'
+    for name in ['responses', 'batches', 'files']:
+        if f'/{name}' in path:
+            return name
+    return path
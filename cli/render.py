@@ -0,0 +1,91 @@
+import sys
+import time
+from typing import TextIO, Optional
+
+
+class StreamRenderer:
+    """
+    Renders streamed response text to the terminal.
+
+    Every delta is wrapped to the configured text width and written with a single write call, so color codes are
+    emitted once per delta instead of once per character. An optional typing animation writes the text one
+    character at a time with the given delay.
+    """
+
+    def __init__(self, out: Optional[TextIO] = None, width: int = 0, color: str = '', color_end: str = '',
+                 typing_delay: float = 0.0):
+        """
+        Args:
+            out (Optional[TextIO]): The stream to write to. Defaults to stdout.
+            width (int, optional): Maximum number of characters per line (0 - as much as possible). Defaults to 0.
+            color (str, optional): The ANSI color code written before the text. Defaults to ''.
+            color_end (str, optional): The ANSI code written after the text. Defaults to ''.
+            typing_delay (float, optional): Number of seconds to wait after every character (0 - no animation).
+                                            Defaults to 0.0.
+        """
+        self.out = out
+        self.width = width
+        self.color = color
+        self.color_end = color_end
+        self.typing_delay = typing_delay
+        self.column = 0
+
+    def write(self, text: str) -> None:
+        """
+        Writes the text wrapped to the configured width.
+
+        Args:
+            text (str): The text to write.
+        """
+        if not text:
+            return
+        out = self.out or sys.stdout
+        wrapped = self.wrap(text)
+        if self.typing_delay > 0:
+            for char in wrapped:
+                out.write(f'{self.color}{char}{self.color_end}')
+                out.flush()
+                time.sleep(self.typing_delay)
+        else:
+            out.write(f'{self.color}{wrapped}{self.color_end}')
+            out.flush()
+
+    def wrap(self, text: str) -> str:
+        """
+        Inserts line breaks into the text, so that no line is longer than the configured width.
+
+        The current column is carried over between calls, so the text can be wrapped delta by delta.
+
+        Args:
+            text (str): The text to wrap.
+
+        Returns:
+            str: The wrapped text.
+        """
+        if self.width <= 0:
+            last_newline = text.rfind('\n')
+            self.column = len(text) - last_newline - 1 if last_newline >= 0 else self.column + len(text)
+            return text
+
+        pieces = []
+        lines = text.split('\n')
+        for index, line in enumerate(lines):
+            if index > 0:
+                pieces.append('\n')
+                self.column = 0
+            start = 0
+            while start < len(line):
+                if self.column >= self.width:
+                    pieces.append('\n')
+                    self.column = 0
+                end = start + self.width - self.column
+                pieces.append(line[start:end])
+                self.column += len(line[start:end])
+                start = end
+        return ''.join(pieces)
+
+    def reset(self) -> None:
+        """
+        Resets the current column, e.g. after a new line was written outside the renderer.
+        """
+        self.column = 0
@@ -0,0 +1,287 @@
+import codecs
+import os
+import re
+from typing import Callable, Iterator, List, Optional, Pattern, Tuple
+
+default_max_file_size = '1048576'
+
+# Directories and files which are never worth sending, even if they are not ignored by git
+default_ignored_dirs = ['.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv', '.tox', '.mypy_cache',
+                        '.pytest_cache', '.idea', '.gradle', 'bower_components']
+default_ignored_files = ['package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock',
+                         'Pipfile.lock', 'Cargo.lock', 'composer.lock', 'Gemfile.lock', 'go.sum', 'uv.lock',
+                         '.DS_Store']
+default_ignored_patterns = ['.chatgpt-cli-*', '*.min.js', '*.min.css', '*.map']
+
+sniff_size = 8192
+magic_chars = re.compile(r'[*?[]')
+
+IgnoreRuleType = Tuple[str, Pattern, bool, bool]
+
+
+class IgnoreRules:
+    """
+    Ignore rules read from .gitignore files, following the git matching semantics.
+
+    Every rule is scoped to the directory of the .gitignore file it was read from. Patterns containing a slash are
+    matched against the path relative to that directory, other patterns against the name at any depth below it.
+    Later rules override earlier ones, so negated patterns ("!pattern") re-include previously ignored paths.
+    """
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root (str): The directory all checked paths are relative to.
+        """
+        self.root = root
+        self.rules: List[IgnoreRuleType] = []
+
+    def add_file(self, path: str, base: str = '') -> None:
+        """
+        Reads the rules from the ignore file, if it exists.
+
+        Args:
+            path (str): The path of the ignore file (e.g. a .gitignore or .git/info/exclude file).
+            base (str, optional): The directory the rules apply to, relative to the root. Defaults to ''.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    self.add_rule(line, base)
+        except OSError:
+            pass
+
+    def add_rule(self, line: str, base: str = '') -> None:
+        """
+        Adds a single rule in the .gitignore format.
+
+        Args:
+            line (str): The line of the ignore file.
+            base (str, optional): The directory of the ignore file, relative to the root. Defaults to ''.
+        """
+        line = line.rstrip('\n').rstrip('\r')
+        if line.strip() == '' or line.startswith('#'):
+            return
+        if not line.endswith('\\ '):
+            line = line.rstrip(' ')
+
+        negate = line.startswith('!')
+        if negate or line.startswith('\\!') or line.startswith('\\#'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if line == '':
+            return
+
+        anchored = '/' in line
+        regex = translate_pattern(line.lstrip('/'))
+        if not anchored:
+            regex = f'(?:.*/)?{regex}'
+        self.rules.append((base, re.compile(f'{regex}$'), negate, dir_only))
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """
+        Checks if the path is ignored.
+
+        Args:
+            rel_path (str): The path relative to the root, separated by slashes.
+            is_dir (bool): Whether the path is a directory.
+
+        Returns:
+            bool: True if the last matching rule ignores the path, otherwise False.
+        """
+        result = False
+        for base, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base != '':
+                if not rel_path.startswith(base + '/'):
+                    continue
+                path = rel_path[len(base) + 1:]
+            else:
+                path = rel_path
+            if regex.match(path):
+                result = not negate
+        return result
+
+
+def scan_files(file_pattern: str, max_size: int = 0, use_gitignore: bool = True,
+               on_skip: Optional[Callable[[str, str], None]] = None) -> Iterator[str]:
+    """
+    Lazily finds the text files matching the glob pattern.
+
+    The directory tree below the fixed prefix of the pattern is walked once in sorted order, and ignored directories
+    (version control and dependency directories, and directories ignored by .gitignore files) are never entered.
+    Like glob, wildcards don't match hidden files. Files ignored by .gitignore, lockfiles and minified files are
+    skipped silently, while binary files and files larger than the size limit are reported through the callback.
+
+    Args:
+        file_pattern (str): The glob pattern, where "**" matches any number of directories.
+        max_size (int, optional): Maximum file size in bytes (0 - unlimited). Defaults to 0.
+        use_gitignore (bool, optional): Whether to honor the .gitignore files. Defaults to True.
+        on_skip (Optional[Callable[[str, str], None]], optional): Called with the path and the reason of every
+                                                                  skipped binary or large file. Defaults to None.
+
+    Returns:
+        Iterator[str]: Yields the paths of the matched files.
+    """
+
+    def accept(path: str) -> bool:
+        size = os.path.getsize(path)
+        if 0 < max_size < size:
+            reason = f'larger than {max_size} bytes'
+        elif is_binary(path):
+            reason = 'binary file'
+        else:
+            return True
+        if on_skip:
+            on_skip(path, reason)
+        return False
+
+    if not magic_chars.search(file_pattern):
+        if os.path.isfile(file_pattern) and accept(file_pattern):
+            yield file_pattern
+        return
+
+    parts = file_pattern.replace(os.sep, '/').split('/')
+    fixed = []
+    for part in parts[:-1]:
+        if magic_chars.search(part):
+            break
+        fixed.append(part)
+    base = '/'.join(fixed) if len(fixed) > 0 else '.'
+    if base == '':
+        base = '/'
+    remaining = parts[len(fixed):]
+    pattern = re.compile(translate_pattern('/'.join(remaining), hidden=False) + '$')
+    max_depth = None if '**' in remaining else len(remaining) - 1
+
+    root = find_git_root(base) if use_gitignore else None
+    rules = IgnoreRules(root or base)
+    for ignored_pattern in default_ignored_patterns + default_ignored_files:
+        rules.add_rule(ignored_pattern)
+    for name in default_ignored_dirs:
+        rules.add_rule(f'{name}/')
+    if root:
+        # Rules of the repository and of the directories above the walked one apply as well
+        rules.add_file(os.path.join(root, '.git', 'info', 'exclude'))
+        rel_base = os.path.relpath(os.path.abspath(base), root)
+        names = [] if rel_base == '.' else rel_base.split(os.sep)
+        for depth in range(len(names)):
+            rules.add_file(os.path.join(root, *names[:depth], '.gitignore'), '/'.join(names[:depth]))
+
+    for directory, dir_names, file_names in os.walk(base):
+        rel_dir = os.path.relpath(directory, rules.root).replace(os.sep, '/')
+        rel_dir = '' if rel_dir == '.' else rel_dir + '/'
+        pattern_dir = os.path.relpath(directory, base).replace(os.sep, '/')
+        pattern_dir = '' if pattern_dir == '.' else pattern_dir + '/'
+        if use_gitignore and '.gitignore' in file_names:
+            rules.add_file(os.path.join(directory, '.gitignore'), rel_dir.rstrip('/'))
+
+        if max_depth is not None and pattern_dir.count('/') >= max_depth:
+            dir_names[:] = []
+        dir_names[:] = sorted(name for name in dir_names if not rules.ignored(rel_dir + name, True) and
+                              not os.path.islink(os.path.join(directory, name)))
+        for name in sorted(file_names):
+            path = os.path.join(directory, name)
+            if len(fixed) == 0 and path.startswith('.' + os.sep):
+                # Like glob, paths matched from the working directory are returned without the "./" prefix
+                path = path[2:]
+            if pattern.match(pattern_dir + name) and not rules.ignored(rel_dir + name, False) and \
+                    os.path.isfile(path) and accept(path):
+                yield path
+
+
+def translate_pattern(pattern: str, hidden: bool = True) -> str:
+    """
+    Translates the glob pattern to a regular expression matching slash separated paths.
+
+    Args:
+        pattern (str): The glob pattern, where "**" matches any number of directories.
+        hidden (bool, optional): Whether wildcards match names starting with a dot. Defaults to True.
+
+    Returns:
+        str: The regular expression.
+    """
+    no_dot = '' if hidden else r'(?!\.)'
+    regex = ''
+    segments = pattern.split('/')
+    for index, segment in enumerate(segments):
+        last = index == len(segments) - 1
+        if segment == '**':
+            regex += f'(?:{no_dot}[^/]*/)*' if not last else f'(?:{no_dot}[^/]*(?:/|$))*'
+            continue
+
+        if magic_chars.match(segment):
+            regex += no_dot
+        position = 0
+        while position < len(segment):
+            char = segment[position]
+            if char == '*':
+                regex += '[^/]*'
+            elif char == '?':
+                regex += '[^/]'
+            elif char == '[':
+                end = segment.find(']', position + 2)
+                if end < 0:
+                    regex += re.escape(char)
+                else:
+                    chars = segment[position + 1:end]
+                    if chars.startswith('!'):
+                        chars = '^' + chars[1:]
+                    regex += f'[{chars}]'
+                    position = end
+            elif char == '\\' and position + 1 < len(segment):
+                position += 1
+                regex += re.escape(segment[position])
+            else:
+                regex += re.escape(char)
+            position += 1
+        if not last:
+            regex += '/'
+    return regex
+
+
+def is_binary(path: str) -> bool:
+    """
+    Checks if the file is binary by sniffing its first bytes for NUL bytes and invalid UTF-8 sequences.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        bool: True if the file looks binary, otherwise False.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(sniff_size)
+    except OSError:
+        return True
+    if b'\0' in head:
+        return True
+    try:
+        # A character may be split at the end of the sniffed block, unless the whole file was read
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=len(head) < sniff_size)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+def find_git_root(directory: str) -> Optional[str]:
+    """
+    Finds the root of the git repository containing the directory.
+
+    Args:
+        directory (str): The directory to start from.
+
+    Returns:
+        Optional[str]: The path of the repository root or None if the directory is not in a git repository.
+    """
+    current = os.path.abspath(directory)
+    while True:
+        if os.path.exists(os.path.join(current, '.git')):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
@@ -0,0 +1,191 @@
+import os
+import sqlite3
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from cli.core import MessageType, count_tokens
+
+default_session_store = os.path.expanduser('~') + '/.chatgpt-cli/sessions.db'
+
+schema = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    log_path TEXT
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    model TEXT,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    cached_tokens INTEGER,
+    latency REAL
+);
+CREATE INDEX IF NOT EXISTS turns_session_idx ON turns (session_id, id);
+"""
+
+fts_schema = """
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5 (content, content='turns', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS turns_fts_insert AFTER INSERT ON turns BEGIN
+    INSERT INTO turns_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+SessionType = Tuple[int, str, int, Optional[str]]
+SearchResultType = Tuple[int, str, str, str]
+
+
+class SessionStore:
+    """
+    Structured append-only store of chat sessions backed by SQLite.
+
+    Every turn is stored as a separate row with its role, content, timestamp, model, token usage and latency, so
+    resuming a session does not depend on parsing the plain-text chat log. Full-text search uses the SQLite FTS5
+    extension when it is available and falls back to a case-insensitive substring search otherwise.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The path of the SQLite database file.
+        """
+        path_dir = os.path.dirname(path)
+        if path_dir != '' and not os.path.exists(path_dir):
+            os.makedirs(path_dir, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(schema)
+        try:
+            self.connection.executescript(fts_schema)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self.connection.commit()
+
+    def start_session(self, log_path: Optional[str] = None) -> int:
+        """
+        Creates a new session.
+
+        Args:
+            log_path (Optional[str], optional): The path of the plain-text chat log of the session. Defaults to None.
+
+        Returns:
+            int: The ID of the new session.
+        """
+        cursor = self.connection.execute('INSERT INTO sessions (started_at, log_path) VALUES (?, ?)',
+                                         (datetime.now().isoformat(), log_path))
+        self.connection.commit()
+        return cursor.lastrowid
+
+    def add_turn(self, session_id: int, role: str, content: str, model: Optional[str] = None,
+                 input_tokens: Optional[int] = None, output_tokens: Optional[int] = None,
+                 cached_tokens: Optional[int] = None, latency: Optional[float] = None) -> None:
+        """
+        Appends a turn to the session.
+
+        Args:
+            session_id (int): The ID of the session.
+            role (str): The role of the turn ('user', 'assistant' or 'reset' for the reset marker).
+            content (str): The content of the turn.
+            model (Optional[str], optional): The model which generated the answer. Defaults to None.
+            input_tokens (Optional[int], optional): Number of input tokens of the request. Defaults to None.
+            output_tokens (Optional[int], optional): Number of output tokens of the answer. Defaults to None.
+            cached_tokens (Optional[int], optional): Number of input tokens read from the prompt cache.
+                                                     Defaults to None.
+            latency (Optional[float], optional): Number of seconds it took to receive the answer. Defaults to None.
+        """
+        self.connection.execute(
+            'INSERT INTO turns (session_id, role, content, created_at, model, input_tokens, output_tokens, '
+            'cached_tokens, latency) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (session_id, role, content, datetime.now().isoformat(), model, input_tokens, output_tokens,
+             cached_tokens, latency))
+        self.connection.commit()
+
+    def last_messages(self, session_id: int, max_messages: int = 0, max_tokens: int = 0) -> List[MessageType]:
+        """
+        Reads the last messages of the session after its last reset marker.
+
+        Args:
+            session_id (int): The ID of the session.
+            max_messages (int, optional): Maximum number of messages to read (0 - unlimited). Defaults to 0.
+            max_tokens (int, optional): Maximum number of tokens of all read messages (0 - unlimited). Defaults to 0.
+
+        Returns:
+            List[MessageType]: The messages in chronological order, starting with a user message.
+        """
+        rows = self.connection.execute(
+            'SELECT role, content FROM turns WHERE session_id = ? AND role != \'reset\' AND id > '
+            '(SELECT COALESCE(MAX(id), 0) FROM turns WHERE session_id = ? AND role = \'reset\') '
+            'ORDER BY id DESC LIMIT ?', (session_id, session_id, max_messages if max_messages > 0 else -1))
+
+        messages = []
+        tokens = 0
+        for role, content in rows:
+            tokens += count_tokens(content)
+            if 0 < max_tokens < tokens and len(messages) > 0:
+                break
+            messages.append({'role': role, 'content': content})
+
+        messages.reverse()
+        while len(messages) > 0 and messages[0]['role'] != 'user':
+            messages.pop(0)
+        return messages
+
+    def list_sessions(self, limit: int = 20) -> List[SessionType]:
+        """
+        Lists the most recent sessions which contain at least one turn.
+
+        Args:
+            limit (int, optional): Maximum number of sessions to list. Defaults to 20.
+
+        Returns:
+            List[SessionType]: Tuples of session ID, start time, number of messages and the first question.
+        """
+        return self.connection.execute(
+            'SELECT s.id, s.started_at, '
+            '(SELECT COUNT(*) FROM turns t WHERE t.session_id = s.id AND t.role != \'reset\'), '
+            '(SELECT t.content FROM turns t WHERE t.session_id = s.id AND t.role = \'user\' ORDER BY t.id LIMIT 1) '
+            'FROM sessions s WHERE EXISTS (SELECT 1 FROM turns t WHERE t.session_id = s.id) '
+            'ORDER BY s.id DESC LIMIT ?', (limit,)).fetchall()
+
+    def search(self, query: str, limit: int = 20) -> List[SearchResultType]:
+        """
+        Searches the content of all turns.
+
+        Args:
+            query (str): The text to search for.
+            limit (int, optional): Maximum number of results. Defaults to 20.
+
+        Returns:
+            List[SearchResultType]: Tuples of session ID, turn time, role and the matching content snippet.
+        """
+        if self.fts:
+            phrase = '"' + query.replace('"', '""') + '"'
+            return self.connection.execute(
+                'SELECT t.session_id, t.created_at, t.role, snippet(turns_fts, 0, \'[\', \']\', \'...\', 12) '
+                'FROM turns_fts JOIN turns t ON t.id = turns_fts.rowid WHERE turns_fts MATCH ? '
+                'ORDER BY t.id DESC LIMIT ?', (phrase, limit)).fetchall()
+        return self.connection.execute(
+            'SELECT session_id, created_at, role, content FROM turns WHERE role != \'reset\' AND '
+            'instr(lower(content), lower(?)) > 0 ORDER BY id DESC LIMIT ?', (query, limit)).fetchall()
+
+    def session_exists(self, session_id: int) -> bool:
+        """
+        Checks if the session with the given ID exists.
+
+        Args:
+            session_id (int): The ID of the session.
+
+        Returns:
+            bool: True if the session exists, otherwise False.
+        """
+        return self.connection.execute('SELECT 1 FROM sessions WHERE id = ?', (session_id,)).fetchone() is not None
+
+    def close(self) -> None:
+        """
+        Closes the database connection.
+        """
+        self.connection.close()
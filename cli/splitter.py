@@ -0,0 +1,208 @@
+import ast
+from typing import List, Optional
+
+from cli.core import count_tokens
+
+python_extensions = ['.py', '.pyw', '.pyi']
+definition_nodes = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+bracket_depths = {'{': 1, '(': 1, '[': 1, '}': -1, ')': -1, ']': -1}
+
+
+def split_source(content: str, file_path: str, max_tokens: int) -> List[str]:
+    """
+    Splits the source code into chunks of at most the given number of tokens at syntax boundaries.
+
+    Python files are split before top-level statements (including their decorators and the comments directly above
+    them), and other files after lines where all brackets are balanced. Consecutive segments are packed into chunks
+    as long as they fit, and segments larger than the limit are split at empty lines. Joining the chunks always gives
+    back the original content.
+
+    Args:
+        content (str): The source code.
+        file_path (str): The path of the source file, used to detect the language.
+        max_tokens (int): Maximum number of tokens per chunk.
+
+    Returns:
+        List[str]: The chunks in the order of the source code.
+    """
+    lines = source_lines(content)
+    boundaries = None
+    if any(file_path.endswith(extension) for extension in python_extensions):
+        boundaries = python_boundaries(content, lines)
+    if boundaries is None:
+        boundaries = bracket_boundaries(lines)
+
+    segments = []
+    for start, end in zip(boundaries, boundaries[1:] + [len(lines)]):
+        if start < end:
+            segments.extend(split_segment(lines[start:end], max_tokens))
+
+    chunks = []
+    chunk_tokens = 0
+    for segment in segments:
+        tokens = count_tokens(segment)
+        if len(chunks) > 0 and chunk_tokens + tokens <= max_tokens:
+            chunks[-1] += segment
+            chunk_tokens += tokens
+        else:
+            chunks.append(segment)
+            chunk_tokens = tokens
+    return chunks
+
+
+def source_header(content: str, file_path: str, max_tokens: int) -> str:
+    """
+    Returns the start of the source code before the first definition, e.g. the imports and the constants.
+
+    The header is sent as a shared context with every chunk of the file, so the chunks can be refactored
+    consistently with the rest of the file.
+
+    Args:
+        content (str): The source code.
+        file_path (str): The path of the source file, used to detect the language.
+        max_tokens (int): Maximum number of tokens of the header.
+
+    Returns:
+        str: The header, shortened to whole lines that fit into the limit.
+    """
+    lines = source_lines(content)
+    end = len(lines)
+    if any(file_path.endswith(extension) for extension in python_extensions):
+        try:
+            nodes = [node for node in ast.parse(content).body if isinstance(node, definition_nodes)]
+            if len(nodes) > 0:
+                end = node_start(nodes[0], lines)
+        except (SyntaxError, ValueError):
+            pass
+    if end == len(lines):
+        end = next((index for index, line in enumerate(lines) if '{' in line), len(lines))
+
+    header = ''
+    header_tokens = 0
+    for line in lines[:end]:
+        header_tokens += count_tokens(line)
+        if header_tokens > max_tokens:
+            break
+        header += line
+    return header
+
+
+def source_lines(content: str) -> List[str]:
+    """
+    Splits the source code into lines at line feeds only, keeping the line endings.
+
+    Unlike str.splitlines, other line boundary characters (e.g. form feeds) are not treated as line breaks, so the
+    line indexes match the line numbers reported by the Python parser.
+
+    Args:
+        content (str): The source code.
+
+    Returns:
+        List[str]: The lines of the source code.
+    """
+    parts = content.split('\n')
+    return [part + '\n' for part in parts[:-1]] + ([parts[-1]] if parts[-1] != '' else [])
+
+
+def python_boundaries(content: str, lines: List[str]) -> Optional[List[int]]:
+    """
+    Finds the indexes of lines where top-level Python statements start.
+
+    Args:
+        content (str): The source code.
+        lines (List[str]): The lines of the source code.
+
+    Returns:
+        Optional[List[int]]: The line indexes or None if the code can not be parsed.
+    """
+    try:
+        nodes = ast.parse(content).body
+    except (SyntaxError, ValueError):
+        return None
+    return sorted({0, *[node_start(node, lines) for node in nodes]})
+
+
+def node_start(node: ast.stmt, lines: List[str]) -> int:
+    """
+    Returns the index of the first line of the statement, including its decorators and the comments above it.
+
+    Args:
+        node (ast.stmt): The top-level statement.
+        lines (List[str]): The lines of the source code.
+
+    Returns:
+        int: The line index.
+    """
+    start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, 'decorator_list', [])]) - 1
+    while start > 0 and lines[start - 1].lstrip().startswith('#'):
+        start -= 1
+    return start
+
+
+def bracket_boundaries(lines: List[str]) -> List[int]:
+    """
+    Finds the indexes of lines which follow a line where all brackets are balanced.
+
+    Brackets inside string literals and line comments are ignored, so the boundaries are approximate for
+    unusual syntax, but a boundary is never placed inside a balanced block.
+
+    Args:
+        lines (List[str]): The lines of the source code.
+
+    Returns:
+        List[int]: The line indexes.
+    """
+    boundaries = [0]
+    depth = 0
+    for index, line in enumerate(lines):
+        quote = None
+        previous = ''
+        for char in line:
+            if quote:
+                if char == quote and previous != '\\':
+                    quote = None
+            elif char in '"\'`':
+                quote = char
+            elif char == '/' and previous == '/':
+                break
+            else:
+                depth += bracket_depths.get(char, 0)
+            previous = char if previous != '\\' else ''
+        depth = max(depth, 0)
+        if depth == 0 and index + 1 < len(lines) and line.strip() != '':
+            boundaries.append(index + 1)
+    return boundaries
+
+
+def split_segment(lines: List[str], max_tokens: int) -> List[str]:
+    """
+    Splits the lines of a segment larger than the limit, preferably at empty lines.
+
+    Args:
+        lines (List[str]): The lines of the segment.
+        max_tokens (int): Maximum number of tokens per part.
+
+    Returns:
+        List[str]: The parts of the segment.
+    """
+    segment = ''.join(lines)
+    if count_tokens(segment) <= max_tokens:
+        return [segment]
+
+    parts = []
+    part = ''
+    part_tokens = 0
+    for index, line in enumerate(lines):
+        line_tokens = count_tokens(line)
+        if part != '' and part_tokens + line_tokens > max_tokens:
+            parts.append(part)
+            part, part_tokens = '', 0
+        part += line
+        part_tokens += line_tokens
+        next_line = lines[index + 1] if index + 1 < len(lines) else ''
+        if part_tokens >= max_tokens * 0.8 and next_line.strip() == '':
+            parts.append(part)
+            part, part_tokens = '', 0
+    if part != '':
+        parts.append(part)
+    return parts
@@ -0,0 +1,187 @@
+import os
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from cli.core import MessageType, icase_contains, count_tokens
+
+role_prefixes = {'user': 'You: ', 'assistant': 'AI: '}
+date_pattern = re.compile(rb'^\[\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{6}]$')
+quit_commands = ['/quit', '/q']
+reset_commands = ['/reset', '/r']
+skipped_answers = ['goodbye', 'let\'s start a new conversation.']
+
+# Every index record has a fixed size, so the last records can be read directly by seeking from the end
+index_record_size = 28
+index_kinds = {'user': b'u', 'assistant': b'a', 'reset': b'r'}
+
+
+class Transcript:
+    """
+    Plain-text chat log with a sidecar index of message byte offsets.
+
+    The log keeps the human-readable format with "You: " and "AI: " prefixes, while the index file next to it
+    ("<log>.idx") records the start and end byte offset of every message and every reset marker. The index is
+    written as the session appends to the log, so resuming a conversation reads only the last records of the index
+    and the messages they point to, instead of parsing the whole log.
+    """
+
+    def __init__(self, path: str, truncate: bool = False):
+        """
+        Args:
+            path (str): The path of the chat log file.
+            truncate (bool, optional): Whether to delete the previous content of the log. Defaults to False.
+        """
+        self.path = path
+        self.index_path = f'{path}.idx'
+        if not truncate and os.path.exists(path) and not self._valid_index():
+            self.rebuild_index()
+        self.file = open(path, 'wb' if truncate else 'ab')
+        self.index = open(self.index_path, 'wb' if truncate else 'ab')
+
+    def write_header(self) -> None:
+        """
+        Writes the timestamp header which starts a new session in the log.
+        """
+        prefix = '\n\n' if self.file.tell() > 0 else ''
+        self._write(f'{prefix}[{datetime.now().isoformat()}]\n')
+        self.file.flush()
+
+    def write_message(self, role: str, content: Optional[str]) -> None:
+        """
+        Appends the message to the log and records it in the index.
+
+        Quit commands, empty questions and the assistant's reset and goodbye answers are written to the log only,
+        and reset commands are recorded in the index as reset markers.
+
+        Args:
+            role (str): The message role, either 'user' or 'assistant'.
+            content (Optional[str]): The message content.
+        """
+        content = content or ''
+        self._write(f'\n{role_prefixes[role]}')
+        start = self.file.tell()
+        self._write(content)
+        end = self.file.tell()
+        self._write('\n')
+        self.file.flush()
+
+        kind = role
+        if role == 'user' and icase_contains(content, reset_commands):
+            kind = 'reset'
+        elif content.strip() == '' or icase_contains(content, quit_commands) or \
+                (role == 'assistant' and icase_contains(content, skipped_answers)):
+            return
+        self._write_record(start, end, kind)
+
+    def last_messages(self, max_messages: int = 0, max_tokens: int = 0) -> List[MessageType]:
+        """
+        Reads the last messages of the conversation after the last reset marker.
+
+        Args:
+            max_messages (int, optional): Maximum number of messages to read (0 - unlimited). Defaults to 0.
+            max_tokens (int, optional): Maximum number of tokens of all read messages (0 - unlimited). Defaults to 0.
+
+        Returns:
+            List[MessageType]: The messages in chronological order, starting with a user message.
+        """
+        messages = []
+        tokens = 0
+        with open(self.index_path, 'rb') as index, open(self.path, 'rb') as log:
+            position = os.fstat(index.fileno()).st_size // index_record_size
+            while position > 0 and (max_messages <= 0 or len(messages) < max_messages):
+                position -= 1
+                index.seek(position * index_record_size)
+                start, end, kind = self._parse_record(index.read(index_record_size))
+                if kind == 'reset':
+                    break
+                log.seek(start)
+                content = log.read(end - start).decode('utf-8', errors='replace').rstrip('\r\n')
+                tokens += count_tokens(content)
+                if 0 < max_tokens < tokens and len(messages) > 0:
+                    break
+                messages.append({'role': kind, 'content': content})
+
+        messages.reverse()
+        while len(messages) > 0 and messages[0]['role'] != 'user':
+            messages.pop(0)
+        return messages
+
+    def rebuild_index(self) -> None:
+        """
+        Recreates the index by scanning the whole log once, e.g. for logs written before the index existed.
+        """
+        records = []
+        role = None
+        start = 0
+        lines = []
+        offset = 0
+
+        def close_message(end: int):
+            content = b''.join(lines).decode('utf-8', errors='replace')
+            if role == 'user' and icase_contains(content.replace('\n', ''), reset_commands):
+                records.append((start, end, 'reset'))
+            elif content.replace('\n', '').strip() != '' and \
+                    not icase_contains(content.replace('\n', ''), quit_commands + skipped_answers):
+                records.append((start, end, role))
+
+        with open(self.path, 'rb') as log:
+            for line in log:
+                new_role = None
+                for candidate, prefix in role_prefixes.items():
+                    if line.startswith(prefix.encode('utf-8')):
+                        new_role = candidate
+                if new_role or date_pattern.match(line.rstrip(b'\r\n')):
+                    if role:
+                        close_message(offset)
+                    role = new_role
+                    lines = []
+                    if new_role:
+                        start = offset + len(role_prefixes[new_role].encode('utf-8'))
+                        lines.append(line[len(role_prefixes[new_role].encode('utf-8')):])
+                elif role:
+                    lines.append(line)
+                offset += len(line)
+            if role:
+                close_message(offset)
+
+        with open(self.index_path, 'wb') as index:
+            for start, end, kind in records:
+                index.write(self._format_record(start, end, kind))
+
+    def close(self) -> None:
+        """
+        Closes the log and the index files.
+        """
+        self.file.close()
+        self.index.close()
+
+    def _valid_index(self) -> bool:
+        try:
+            size = os.path.getsize(self.index_path)
+            if size % index_record_size != 0:
+                return False
+            if size == 0:
+                return os.path.getsize(self.path) == 0
+            with open(self.index_path, 'rb') as index:
+                index.seek(size - index_record_size)
+                _, end, _ = self._parse_record(index.read(index_record_size))
+            return end <= os.path.getsize(self.path)
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _write(self, text: str) -> None:
+        self.file.write(text.encode('utf-8'))
+
+    def _write_record(self, start: int, end: int, kind: str) -> None:
+        self.index.write(self._format_record(start, end, kind))
+        self.index.flush()
+
+    @staticmethod
+    def _format_record(start: int, end: int, kind: str) -> bytes:
+        return b'%012d %012d %s\n' % (start, end, index_kinds[kind])
+
+    @staticmethod
+    def _parse_record(record: bytes) -> Tuple[int, int, str]:
+        kinds = {value: key for key, value in index_kinds.items()}
+        return int(record[0:12]), int(record[13:25]), kinds[record[26:27]]
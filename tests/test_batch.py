@@ -0,0 +1,104 @@
+import json
+
+import pytest
+from openai import OpenAI
+
+import cli.core
+from cli.batch import run_batch
+from server import start_server
+
+targets = ['src/a.py', 'src/b.py', 'src/c.py']
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    server, base_url = start_server(batch_polls=2)
+    monkeypatch.setattr(cli.core, 'client_instance', OpenAI(api_key='sk-test', base_url=base_url, max_retries=0))
+    monkeypatch.setenv('GPT_BATCH_STATE_FILE', str(tmp_path / 'batch.json'))
+    monkeypatch.setenv('GPT_BATCH_POLL_INTERVAL', '0.01')
+    yield server
+    server.shutdown()
+
+
+def build_messages(target):
+    return [{'role': 'user', 'content': f'Summarize {target}'}]
+
+
+def interrupted_run(job):
+    def apply_result(target, text, error):
+        raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        run_batch('test', job, targets, build_messages, apply_result)
+
+
+def test_run_batch_applies_all_results(stub, tmp_path):
+    results = {}
+    run_batch('test', 'job', targets, build_messages, lambda target, text, error: results.update({target: error}))
+    assert results == {target: None for target in targets}
+    assert not (tmp_path / 'batch.json').exists()
+
+
+def test_run_batch_resumes_submitted_batch(stub, tmp_path):
+    interrupted_run('job')
+    state = json.loads((tmp_path / 'batch.json').read_text())
+    assert state['pending'] == [] and len(state['batches']) == 1 and not state['batches'][0]['applied']
+
+    applied = []
+    run_batch('test', 'job', targets, build_messages, lambda target, text, error: applied.append(target))
+    assert applied == targets
+    assert len(stub.RequestHandlerClass.batches) == 1
+    assert not (tmp_path / 'batch.json').exists()
+
+
+def test_run_batch_resumes_after_partially_applied_batch(stub, tmp_path):
+    applied = []
+
+    def apply_once(target, text, error):
+        if len(applied) > 0:
+            raise KeyboardInterrupt()
+        applied.append(target)
+
+    with pytest.raises(KeyboardInterrupt):
+        run_batch('test', 'job', targets, build_messages, apply_once)
+    state = json.loads((tmp_path / 'batch.json').read_text())
+    assert state['batches'][0]['done'] == ['request-0-0'] and not state['batches'][0]['applied']
+
+    # The applied target is no longer sent (e.g. it is skipped as already refactored), but still matched
+    run_batch('test', 'job', targets[1:], build_messages, lambda target, text, error: applied.append(target),
+              matched_targets=targets)
+    assert applied == targets
+    assert len(stub.RequestHandlerClass.batches) == 1
+    assert not (tmp_path / 'batch.json').exists()
+
+
+def test_run_batch_resumes_without_applied_targets(stub, tmp_path):
+    state = {'command': 'test', 'job': 'job', 'targets': targets, 'pending': targets[1:],
+             'batches': [{'id': 'batch-0', 'targets': {'request-0-0': targets[0]}, 'applied': True}]}
+    (tmp_path / 'batch.json').write_text(json.dumps(state))
+
+    applied = []
+    run_batch('test', 'job', targets[1:], build_messages, lambda target, text, error: applied.append(target))
+    assert applied == targets[1:]
+
+
+@pytest.mark.parametrize('job,files', [('other job', targets), ('job', targets[:1]), ('job', targets + ['src/d.py'])])
+def test_run_batch_refuses_different_job(stub, tmp_path, job, files):
+    interrupted_run('job')
+    saved = (tmp_path / 'batch.json').read_text()
+
+    applied = []
+    with pytest.raises(SystemExit) as e:
+        run_batch('test', job, files, build_messages, lambda target, text, error: applied.append(target))
+    assert e.value.code == 1
+    assert applied == []
+    assert (tmp_path / 'batch.json').read_text() == saved
+
+
+def test_run_batch_rejects_invalid_state_file(stub, tmp_path):
+    (tmp_path / 'batch.json').write_text('{invalid')
+
+    with pytest.raises(SystemExit) as e:
+        run_batch('test', 'job', targets, build_messages, lambda target, text, error: None)
+    assert e.value.code == 2
+    assert stub.RequestHandlerClass.batches == {}
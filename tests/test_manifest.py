@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from cli.manifest import RefactorManifest, file_hash
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    return str(tmp_path / 'manifest.json')
+
+
+def write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+    return file_hash(str(path))
+
+
+def test_refactored_file_is_done_before_and_after(tmp_path, manifest_path):
+    before = write(tmp_path / 'a.py', 'x = 1\n')
+    after = write(tmp_path / 'a.py', 'X = 1\n')
+    RefactorManifest(manifest_path).record('job', 'a.py', before, after)
+
+    manifest = RefactorManifest(manifest_path)
+    assert manifest.is_done('job', 'a.py', before)
+    assert manifest.is_done('job', './a.py', after)
+    assert not manifest.is_done('job', 'a.py', write(tmp_path / 'a.py', 'x = 2\n'))
+    assert not manifest.is_done('other job', 'a.py', after)
+
+
+def test_files_with_identical_content_are_recorded_separately(tmp_path, manifest_path):
+    before = write(tmp_path / 'a.py', 'x = 1\n')
+    after = write(tmp_path / 'a.py', 'X = 1\n')
+    manifest = RefactorManifest(manifest_path)
+    manifest.record('job', 'a.py', before, after)
+
+    # A new file with the content a.py had before or after the refactoring was never refactored itself
+    assert write(tmp_path / 'b.py', 'x = 1\n') == before
+    assert not manifest.is_done('job', 'b.py', before)
+    assert not manifest.is_done('job', 'b.py', after)
+
+    manifest.record('job', 'b.py', before, after)
+    assert RefactorManifest(manifest_path).is_done('job', 'b.py', after)
+    assert RefactorManifest(manifest_path).is_done('job', 'a.py', after)
+
+
+def test_invalid_manifest_is_ignored(tmp_path, manifest_path):
+    write(manifest_path, '{invalid')
+    manifest = RefactorManifest(manifest_path)
+    assert not manifest.is_done('job', 'a.py', 'hash')
+
+    manifest.record('job', 'a.py', 'before', 'after')
+    with open(manifest_path) as f:
+        assert json.load(f) == {'files': {'a.py': {'job': ['before', 'after']}}}
@@ -0,0 +1,90 @@
+import pytest
+
+from cli.patch import PatchError, apply_edit_blocks, parse_edit_blocks
+
+content = '''import os
+
+
+def first():
+    return 1
+
+
+def second():
+    return 2
+'''
+
+
+def test_parse_edit_blocks_ignores_text_outside_blocks():
+    text = '''Here are the changes:
+```python
+<<<<<<< SEARCH
+def first():
+    return 1
+=======
+def first():
+    return 10
+>>>>>>> REPLACE
+```
+And another one:
+<<<<<<<SEARCH
+import os
+========
+import sys
+>>>>>>>REPLACE
+'''
+    assert parse_edit_blocks(text) == [
+        ('def first():\n    return 1', 'def first():\n    return 10'),
+        ('import os', 'import sys')
+    ]
+
+
+def test_parse_edit_blocks_without_blocks():
+    assert parse_edit_blocks('') == []
+    assert parse_edit_blocks('No changes are needed.') == []
+
+
+def test_parse_edit_blocks_keeps_empty_parts():
+    text = '<<<<<<< SEARCH\n=======\nnew line\n>>>>>>> REPLACE\n<<<<<<< SEARCH\nold line\n=======\n>>>>>>> REPLACE'
+    assert parse_edit_blocks(text) == [('', 'new line'), ('old line', '')]
+
+
+@pytest.mark.parametrize('text', [
+    '<<<<<<< SEARCH\nold\n=======\nnew\n',
+    '<<<<<<< SEARCH\nold\n',
+    '<<<<<<< SEARCH\nold\n=======\nnew\n>>>>>>> REPLACE\n<<<<<<< SEARCH\nold\n'
+])
+def test_parse_edit_blocks_rejects_unterminated_block(text):
+    with pytest.raises(PatchError):
+        parse_edit_blocks(text)
+
+
+def test_apply_edit_blocks_in_order():
+    blocks = [('import os', 'import sys'), ('    return 1', '    return 10'), ('    return 2', '    return 20')]
+    assert apply_edit_blocks(content, blocks) == content.replace('os', 'sys').replace('1', '10').replace('2', '20')
+
+
+def test_apply_edit_blocks_sees_previous_edits():
+    blocks = [('    return 1', '    return 3'), ('def first():\n    return 3', 'def first():\n    return 4')]
+    assert '    return 4\n' in apply_edit_blocks(content, blocks)
+
+
+def test_apply_edit_blocks_removes_deleted_lines():
+    edited = apply_edit_blocks(content, [('def second():\n    return 2', '')])
+    assert edited == content.replace('def second():\n    return 2\n', '')
+
+
+def test_apply_edit_blocks_rejects_missing_search():
+    with pytest.raises(PatchError, match='not found'):
+        apply_edit_blocks(content, [('    return 3', '    return 4')])
+
+
+def test_apply_edit_blocks_rejects_ambiguous_search():
+    with pytest.raises(PatchError, match='found 2 times'):
+        apply_edit_blocks(content, [('\n\ndef ', '\n\nasync def ')])
+
+
+def test_apply_edit_blocks_with_empty_search():
+    assert apply_edit_blocks('', [('', 'print(1)')]) == 'print(1)\n'
+    assert apply_edit_blocks('\n', [('', 'print(1)')]) == 'print(1)\n'
+    with pytest.raises(PatchError, match='empty file'):
+        apply_edit_blocks(content, [('', 'print(1)')])
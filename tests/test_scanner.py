@@ -0,0 +1,172 @@
+import os
+import re
+
+import pytest
+
+from cli.scanner import IgnoreRules, is_binary, scan_files, translate_pattern
+
+
+def rules_of(*lines, base=''):
+    rules = IgnoreRules('.')
+    for line in lines:
+        rules.add_rule(line, base)
+    return rules
+
+
+def write(path, content='', mode='w'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.write(content)
+
+
+@pytest.mark.parametrize('pattern,path,matched', [
+    ('*.py', 'main.py', True),
+    ('*.py', 'cli/main.py', False),
+    ('cli/?.py', 'cli/a.py', True),
+    ('cli/?.py', 'cli/ab.py', False),
+    ('**/*.py', 'main.py', True),
+    ('**/*.py', 'cli/command/ai.py', True),
+    ('a/**/b', 'a/b', True),
+    ('a/**/b', 'a/x/y/b', True),
+    ('a/**', 'a/x/y', True),
+    ('[abc].txt', 'b.txt', True),
+    ('[!abc].txt', 'b.txt', False),
+    ('[!abc].txt', 'd.txt', True),
+    ('file[.txt', 'file[.txt', True),
+    ('\\*.txt', '*.txt', True),
+    ('\\*.txt', 'a.txt', False)
+])
+def test_translate_pattern(pattern, path, matched):
+    assert bool(re.match(translate_pattern(pattern) + '$', path)) == matched
+
+
+def test_translate_pattern_skips_hidden_names():
+    assert re.match(translate_pattern('*.py', hidden=False) + '$', '.hidden.py') is None
+    assert re.match(translate_pattern('**/*.py', hidden=False) + '$', '.venv/main.py') is None
+    assert re.match(translate_pattern('.*.py', hidden=False) + '$', '.hidden.py') is not None
+    assert re.match(translate_pattern('*.py') + '$', '.hidden.py') is not None
+
+
+def test_unanchored_rules_match_at_any_depth():
+    rules = rules_of('build', '*.log')
+    assert rules.ignored('build', True)
+    assert rules.ignored('src/build', True)
+    assert rules.ignored('src/app/debug.log', False)
+    assert not rules.ignored('builds', True)
+
+
+def test_anchored_rules_match_relative_to_base():
+    rules = rules_of('/build', 'docs/*.md')
+    assert rules.ignored('build', True)
+    assert not rules.ignored('src/build', True)
+    assert rules.ignored('docs/index.md', False)
+    assert not rules.ignored('docs/api/index.md', False)
+    assert not rules.ignored('src/docs/index.md', False)
+
+
+def test_negated_rules_override_earlier_rules():
+    rules = rules_of('*.log', '!keep.log')
+    assert rules.ignored('debug.log', False)
+    assert not rules.ignored('keep.log', False)
+    assert not rules.ignored('logs/keep.log', False)
+
+    # The last matching rule wins
+    rules = rules_of('!keep.log', '*.log')
+    assert rules.ignored('keep.log', False)
+
+
+def test_directory_rules_do_not_match_files():
+    rules = rules_of('out/')
+    assert rules.ignored('out', True)
+    assert rules.ignored('src/out', True)
+    assert not rules.ignored('out', False)
+
+
+def test_rules_are_scoped_to_their_directory():
+    rules = rules_of('*.tmp', '/local', base='sub')
+    assert rules.ignored('sub/a.tmp', False)
+    assert rules.ignored('sub/deep/a.tmp', False)
+    assert not rules.ignored('a.tmp', False)
+    assert not rules.ignored('subdir/a.tmp', False)
+    assert rules.ignored('sub/local', False)
+    assert not rules.ignored('sub/deep/local', False)
+
+
+def test_comments_escapes_and_whitespace():
+    rules = rules_of('# comment', '', '   ', '\\#hash', '\\!bang', 'trailing   ', 'kept\\ ')
+    assert not rules.ignored('# comment', False)
+    assert rules.ignored('#hash', False)
+    assert rules.ignored('!bang', False)
+    assert rules.ignored('trailing', False)
+    assert rules.ignored('kept ', False)
+    assert not rules.ignored('kept', False)
+
+
+def test_is_binary(tmp_path):
+    write(str(tmp_path / 'text.txt'), 'Čćžšđ 日本語\n')
+    write(str(tmp_path / 'nul.bin'), b'abc\0def', 'wb')
+    write(str(tmp_path / 'latin1.txt'), 'caf\xe9 au lait'.encode('latin-1'), 'wb')
+    write(str(tmp_path / 'truncated.txt'), 'caf\xe9'.encode('latin-1'), 'wb')
+    # A multi-byte character split at the end of the sniffed block is still text
+    write(str(tmp_path / 'split.txt'), ('a' * 8191 + 'č').encode('utf-8'), 'wb')
+
+    assert not is_binary(str(tmp_path / 'text.txt'))
+    assert is_binary(str(tmp_path / 'nul.bin'))
+    assert is_binary(str(tmp_path / 'latin1.txt'))
+    assert is_binary(str(tmp_path / 'truncated.txt'))
+    assert not is_binary(str(tmp_path / 'split.txt'))
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / '.git' / 'info')
+    write(str(tmp_path / '.git' / 'info' / 'exclude'), 'excluded.py\n')
+    write(str(tmp_path / '.gitignore'), '*.gen.py\nbuild/\n!keep.gen.py\n')
+    write(str(tmp_path / 'main.py'), 'print(1)\n')
+    write(str(tmp_path / 'excluded.py'), 'print(1)\n')
+    write(str(tmp_path / 'model.gen.py'), 'print(1)\n')
+    write(str(tmp_path / 'keep.gen.py'), 'print(1)\n')
+    write(str(tmp_path / '.hidden.py'), 'print(1)\n')
+    write(str(tmp_path / 'build' / 'out.py'), 'print(1)\n')
+    write(str(tmp_path / 'node_modules' / 'lib' / 'index.js'), 'x\n')
+    write(str(tmp_path / 'package-lock.json'), '{}\n')
+    write(str(tmp_path / 'src' / '.gitignore'), '/local.py\n')
+    write(str(tmp_path / 'src' / 'app.py'), 'print(1)\n')
+    write(str(tmp_path / 'src' / 'app.gen.py'), 'print(1)\n')
+    write(str(tmp_path / 'src' / 'local.py'), 'print(1)\n')
+    write(str(tmp_path / 'src' / 'pkg' / 'local.py'), 'print(1)\n')
+    write(str(tmp_path / 'src' / 'pkg' / 'data.py'), b'\0\0\0', 'wb')
+    write(str(tmp_path / 'src' / 'pkg' / 'big.py'), 'x = 1\n' * 100)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_scan_files_honors_ignore_rules(project):
+    skipped = []
+    files = list(scan_files('**/*.py', max_size=100, on_skip=lambda path, reason: skipped.append((path, reason))))
+
+    assert files == ['keep.gen.py', 'main.py', os.path.join('src', 'app.py'), os.path.join('src', 'pkg', 'local.py')]
+    assert skipped == [(os.path.join('src', 'pkg', 'big.py'), 'larger than 100 bytes'),
+                       (os.path.join('src', 'pkg', 'data.py'), 'binary file')]
+
+
+def test_scan_files_limits_depth_without_double_star(project):
+    assert list(scan_files('src/*.py')) == [os.path.join('src', 'app.py')]
+    assert list(scan_files('*/*/*.py', max_size=100)) == [os.path.join('src', 'pkg', 'local.py')]
+
+
+def test_scan_files_applies_rules_of_parent_directories(project):
+    assert list(scan_files('src/**/*.py', max_size=100)) == [os.path.join('src', 'app.py'),
+                                                             os.path.join('src', 'pkg', 'local.py')]
+
+
+def test_scan_files_without_gitignore(project):
+    files = list(scan_files('**/*.py', max_size=100, use_gitignore=False))
+    assert 'model.gen.py' in files and 'excluded.py' in files and os.path.join('build', 'out.py') in files
+    assert not any(path.startswith('node_modules') for path in scan_files('**/*.js', use_gitignore=False))
+
+
+def test_scan_files_with_plain_path(project):
+    assert list(scan_files('model.gen.py')) == ['model.gen.py']
+    assert list(scan_files('missing.py')) == []
+    assert list(scan_files(os.path.join('src', 'pkg', 'data.py'))) == []
@@ -0,0 +1,162 @@
+import pytest
+
+import cli.core
+from cli.core import count_tokens
+from cli.splitter import bracket_boundaries, python_boundaries, source_header, source_lines, split_segment, \
+    split_source
+
+python_source = '''"""Module docstring."""
+import os
+import sys
+
+LIMIT = 10
+
+
+# Comment directly above the function
+@decorator
+@other(
+    argument=1
+)
+def first(items):
+    """Returns the first item."""
+    return items[0] if items else None
+
+
+class Second:
+    def method(self):
+        text = """
+def not_a_boundary():
+    pass
+"""
+        return text
+
+
+def third():
+    values = {
+        'key': [1, 2, 3],
+    }
+    return values
+'''
+
+javascript_source = '''import a from './a';
+
+const text = "not a { bracket";
+// a comment with an unbalanced ( bracket
+
+function first(items) {
+  if (items.length > 0) {
+    return items[0];
+  }
+  return null;
+}
+
+const config = {
+  key: [1, 2, 3],
+  other: `template }`,
+};
+'''
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # The chunk sizes below are computed with the estimate used when tiktoken is not installed
+    monkeypatch.setattr(cli.core, 'get_token_encoding', lambda: None)
+
+
+@pytest.mark.parametrize('content,expected', [
+    ('', []),
+    ('a', ['a']),
+    ('a\n', ['a\n']),
+    ('a\nb', ['a\n', 'b']),
+    ('a\n\nb\n', ['a\n', '\n', 'b\n']),
+    ('a\r\nb\r\n', ['a\r\n', 'b\r\n']),
+    ('a\x0cb c\n', ['a\x0cb c\n'])
+])
+def test_source_lines(content, expected):
+    assert source_lines(content) == expected
+    assert ''.join(source_lines(content)) == content
+
+
+@pytest.mark.parametrize('content,file_path', [
+    (python_source, 'module.py'),
+    (javascript_source, 'module.js'),
+    ('def broken(:\n    pass\n\n\ndef other():\n    pass\n', 'broken.py'),
+    (python_source.replace('\n', '\r\n'), 'module.py'),
+    (python_source.rstrip('\n'), 'module.py'),
+    ('x = 1\n\x0c\ny = 2\n' * 20, 'module.py'),
+    ('', 'empty.py')
+])
+@pytest.mark.parametrize('max_tokens', [1, 10, 40, 100000])
+def test_split_source_round_trip(content, file_path, max_tokens):
+    assert ''.join(split_source(content, file_path, max_tokens)) == content
+
+
+def test_split_source_keeps_small_file_in_one_chunk():
+    assert split_source(python_source, 'module.py', 100000) == [python_source]
+
+
+def test_python_boundaries_include_decorators_and_comments():
+    lines = source_lines(python_source)
+    starts = [lines[index].rstrip('\n') for index in python_boundaries(python_source, lines)]
+
+    assert starts == ['"""Module docstring."""', 'import os', 'import sys', 'LIMIT = 10',
+                      '# Comment directly above the function', 'class Second:', 'def third():']
+    assert python_boundaries('def broken(:\n', source_lines('def broken(:\n')) is None
+
+
+def test_split_source_splits_python_before_top_level_statements():
+    lines = source_lines(python_source)
+    boundaries = python_boundaries(python_source, lines)
+    segments = [''.join(lines[start:end]) for start, end in zip(boundaries, boundaries[1:] + [len(lines)])]
+    max_tokens = max(count_tokens(segment) for segment in segments)
+    chunks = split_source(python_source, 'module.py', max_tokens)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= max_tokens for chunk in chunks)
+    assert all(lines.index(chunk.split('\n')[0] + '\n') in boundaries for chunk in chunks)
+
+
+def test_split_source_splits_other_files_at_balanced_lines():
+    chunks = split_source(javascript_source, 'module.js', 30)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        depth = sum(chunk.count(bracket) for bracket in '{[(') - sum(chunk.count(bracket) for bracket in '}])')
+        assert depth == 0 or 'not a {' in chunk or 'unbalanced (' in chunk or 'template }' in chunk
+
+
+def test_bracket_boundaries_ignore_strings_and_comments():
+    lines = source_lines(javascript_source)
+    boundaries = bracket_boundaries(lines)
+
+    function_start = lines.index('function first(items) {\n')
+    function_end = lines.index('}\n')
+    config_start = lines.index('const config = {\n')
+    # Boundaries follow the last non-empty balanced line, so they are placed before the empty lines between blocks
+    assert function_start - 1 in boundaries and function_end + 1 in boundaries
+    assert not set(range(function_start + 1, function_end + 1)) & set(boundaries)
+    assert not set(range(config_start + 1, len(lines))) & set(boundaries)
+
+
+def test_split_segment_splits_at_empty_lines():
+    body = ''.join(f'    value_{index} = {index}\n' + ('\n' if index % 12 == 11 else '') for index in range(48))
+    lines = source_lines(f'def large():\n{body}')
+    parts = split_segment(lines, 60)
+
+    assert len(parts) > 1
+    assert ''.join(parts) == ''.join(lines)
+    assert all(count_tokens(part) <= 60 for part in parts)
+    # The first part ends before the empty line once it is large enough, instead of growing up to the limit
+    assert parts[0].endswith('    value_11 = 11\n') and parts[1].startswith('\n')
+    assert split_segment(lines[:3], 60) == [''.join(lines[:3])]
+
+
+def test_source_header():
+    header = source_header(python_source, 'module.py', 1000)
+    assert header.startswith('"""Module docstring."""\nimport os\n')
+    assert 'LIMIT = 10' in header
+    assert '# Comment directly above the function' not in header
+
+    assert source_header(javascript_source, 'module.js', 1000) == \
+           javascript_source[:javascript_source.index('const text')]
+    assert source_header(python_source, 'module.py', 12).count('\n') < header.count('\n')
@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+from cli.transcript import Transcript
+
+
+def write_conversation(path, turns, reset_after=None):
+    transcript = Transcript(str(path))
+    transcript.write_header()
+    for number, (question, answer) in enumerate(turns):
+        transcript.write_message('user', question)
+        transcript.write_message('assistant', answer)
+        if reset_after == number:
+            transcript.write_message('user', '/reset')
+            transcript.write_message('assistant', 'Let\'s start a new conversation.')
+    transcript.close()
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / 'chat.txt'
+
+
+def test_last_messages_returns_messages_in_order(log_path):
+    write_conversation(log_path, [('Hello', 'Hi!'), ('Two\nlines', 'Answer\n\nwith a blank line')])
+
+    assert Transcript(str(log_path)).last_messages() == [
+        {'role': 'user', 'content': 'Hello'},
+        {'role': 'assistant', 'content': 'Hi!'},
+        {'role': 'user', 'content': 'Two\nlines'},
+        {'role': 'assistant', 'content': 'Answer\n\nwith a blank line'}
+    ]
+
+
+def test_last_messages_reads_unicode_content_by_offsets(log_path):
+    write_conversation(log_path, [('Čćžšđ 日本語?', 'Odgovor ✓')])
+
+    messages = Transcript(str(log_path)).last_messages()
+    assert [message['content'] for message in messages] == ['Čćžšđ 日本語?', 'Odgovor ✓']
+
+
+def test_last_messages_stops_at_last_reset(log_path):
+    write_conversation(log_path, [('Old question', 'Old answer'), ('New question', 'New answer')], reset_after=0)
+
+    messages = Transcript(str(log_path)).last_messages()
+    assert [message['content'] for message in messages] == ['New question', 'New answer']
+
+
+def test_last_messages_starts_with_user_message(log_path):
+    write_conversation(log_path, [('Q1', 'A1'), ('Q2', 'A2'), ('Q3', 'A3')])
+
+    transcript = Transcript(str(log_path))
+    assert [message['content'] for message in transcript.last_messages(max_messages=4)] == ['Q2', 'A2', 'Q3', 'A3']
+    assert [message['content'] for message in transcript.last_messages(max_messages=3)] == ['Q3', 'A3']
+
+
+def test_last_messages_limits_tokens(log_path):
+    write_conversation(log_path, [('word ' * 100, 'word ' * 100), ('Q', 'A')])
+
+    messages = Transcript(str(log_path)).last_messages(max_tokens=50)
+    assert [message['content'] for message in messages] == ['Q', 'A']
+
+
+def test_commands_and_empty_messages_are_not_indexed(log_path):
+    transcript = Transcript(str(log_path))
+    transcript.write_header()
+    transcript.write_message('user', 'Question')
+    transcript.write_message('assistant', 'Answer')
+    transcript.write_message('user', '')
+    transcript.write_message('user', '/quit')
+    transcript.write_message('assistant', 'Goodbye')
+    transcript.close()
+
+    assert os.path.getsize(f'{log_path}.idx') == 2 * 28
+    assert [message['content'] for message in Transcript(str(log_path)).last_messages()] == ['Question', 'Answer']
+
+
+def test_rebuild_index_matches_written_index(log_path):
+    write_conversation(log_path, [('Q1', 'A1\nmore'), ('Čć', 'A2'), ('Q3', ''), ('Q4', 'A4')], reset_after=0)
+    written_size = os.path.getsize(f'{log_path}.idx')
+    written = Transcript(str(log_path)).last_messages()
+
+    Transcript(str(log_path)).rebuild_index()
+    assert os.path.getsize(f'{log_path}.idx') == written_size
+    assert Transcript(str(log_path)).last_messages() == written
+    assert [message['content'] for message in written] == ['Čć', 'A2', 'Q3', 'Q4', 'A4']
+
+
+def test_missing_or_stale_index_is_rebuilt(log_path):
+    write_conversation(log_path, [('Q1', 'A1'), ('Q2', 'A2')])
+    os.remove(f'{log_path}.idx')
+    assert [message['content'] for message in Transcript(str(log_path)).last_messages()] == ['Q1', 'A1', 'Q2', 'A2']
+
+    # A log rewritten without updating the index leaves records pointing past its end
+    with open(log_path, 'w') as f:
+        f.write('You: Only\n\nAI: This\n')
+    assert [message['content'] for message in Transcript(str(log_path)).last_messages()] == ['Only', 'This']
+
+
+def test_truncate_starts_new_log(log_path):
+    write_conversation(log_path, [('Q1', 'A1')])
+
+    transcript = Transcript(str(log_path), truncate=True)
+    assert transcript.last_messages() == []
+    transcript.close()
+    assert os.path.getsize(log_path) == 0